@@ -1,7 +1,10 @@
 from flask import Flask, render_template, request, redirect, url_for, flash,jsonify
+from flask import json as flask_json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, case, func, literal, not_, or_, tuple_
+from sqlalchemy.exc import IntegrityError
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_cors import CORS
 from flask_limiter import Limiter
@@ -12,17 +15,20 @@ import dateparser
 import math
 import re
 import json
+import hashlib
+import time
 import os
-import requests
 import sentry_sdk
 from sentry_sdk.integrations.flask import FlaskIntegration
-from scraper import get_gameweek_teams, get_results, get_round_scores, get_next_start_time, get_round_start_time
+from http_client import session as http_session, pool_stats
+from scheduler import Scheduler
+import push
+from scraper import get_gameweek_teams, get_results, get_round_scores, get_next_start_time, get_round_start_time, date_parse_stats, invalidate_snapshots
 from datetime import datetime,timedelta
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from collections import namedtuple
+from string import Template
+from mailer import BulkMailer
 from itsdangerous import URLSafeTimedSerializer
-import pandas as pd
 
 try:
     import jwt as _pyjwt
@@ -58,7 +64,9 @@ CORS(app, resources={r"/*": {"origins": [
     "http://127.0.0.1:*",
 ]}})
 
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)  # app re-logs-in on launch; long-lived so sessions don't expire mid-use
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)  # long-lived so sessions don't expire mid-use
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=90)  # the app trades it for fresh tokens on launch
+REFRESH_SESSION_MAX_AGE = timedelta(days=365)  # rotation can't extend a sign-in past this; then log in again
 jwt = JWTManager(app)
 limiter = Limiter(get_remote_address, app=app, default_limits=["200 per minute"], storage_uri="memory://")
 s = URLSafeTimedSerializer(app.config['SECRET_KEY'])
@@ -93,10 +101,9 @@ def _get_fcm_access_token():
             'scope': 'https://www.googleapis.com/auth/firebase.messaging',
         }
         assertion = _pyjwt.encode(payload, creds['private_key'], algorithm='RS256')
-        resp = requests.post(
+        resp = http_session.post(
             'https://oauth2.googleapis.com/token',
             data={'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer', 'assertion': assertion},
-            timeout=10,
         )
         resp.raise_for_status()
         _fcm_access_token = resp.json()['access_token']
@@ -106,13 +113,25 @@ def _get_fcm_access_token():
         logger.warning(f"FCM auth failed: {e}")
         return None
 
+def _fcm_error_code(resp):
+    """The errorCode of the FcmError detail in an FCM v1 error response, or None."""
+    try:
+        details = resp.json()['error'].get('details', [])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    for detail in details if isinstance(details, list) else []:
+        if isinstance(detail, dict) and detail.get('@type', '').endswith('google.firebase.fcm.v1.FcmError'):
+            return detail.get('errorCode')
+    return None
+
 def send_push(token, title, body):
-    """Send a push notification to one FCM token via HTTP v1 API. Never raises."""
+    """Send a push notification to one FCM token via HTTP v1 API. Never raises.
+    Returns push.SENT, push.FAILED or push.UNREGISTERED (the token no longer exists)."""
     if not token:
-        return
+        return push.FAILED
     access_token = _get_fcm_access_token()
     if not access_token:
-        return
+        return push.FAILED
     try:
         url = f'https://fcm.googleapis.com/v1/projects/{FIREBASE_PROJECT_ID}/messages:send'
         payload = {
@@ -123,16 +142,27 @@ def send_push(token, title, body):
                 'apns': {'payload': {'aps': {'sound': 'default'}}},
             }
         }
-        resp = requests.post(
+        resp = http_session.post(
             url,
             headers={'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json'},
             json=payload,
-            timeout=10,
         )
-        if resp.status_code != 200:
-            logger.warning(f"FCM send failed {resp.status_code}: {resp.text[:200]}")
+        if resp.status_code == 200:
+            return push.SENT
+        # Only FCM's own verdict on the token: a bare 404 could be a wrong project ID or URL,
+        # and treating that as dead tokens would forget every user's
+        if _fcm_error_code(resp) == 'UNREGISTERED':
+            return push.UNREGISTERED
+        logger.warning(f"FCM send failed {resp.status_code}: {resp.text[:200]}")
     except Exception as e:
         logger.warning(f"Push failed for token {str(token)[:20]}: {e}")
+    return push.FAILED
+
+def _prune_fcm_tokens(tokens):
+    """Forget tokens FCM reported as unregistered, so they aren't tried again. Doesn't commit."""
+    if not tokens:
+        return 0
+    return User.query.filter(User.fcm_token.in_(tokens)).update({User.fcm_token: None}, synchronize_session=False)
 
 def _team_display(team_key):
     """Convert internal team key to a readable name."""
@@ -143,10 +173,16 @@ def _team_display(team_key):
 
 @app.route('/live-fixtures', methods=['GET'])
 def live_fixtures():
-    gameweek_teams = GameWeekTeams.query.first()
-    if not gameweek_teams or not gameweek_teams.round_results:
-        return jsonify({"fixtures": []})
-    return jsonify({"fixtures": json.loads(gameweek_teams.round_results)})
+    # Clients echo the last results version (?version=N or If-None-Match) and get a bodiless 304
+    # until a score actually changes.
+    row = db.session.query(GameWeekTeams.results_version, GameWeekTeams.round_results).first()
+    if not row or not row.round_results:
+        return jsonify({"fixtures": [], "version": (row.results_version or 0) if row else 0})
+    version = str(row.results_version or 0)
+    headers = {'ETag': f'"{version}"', 'Cache-Control': 'no-cache'}
+    if request.args.get('version') == version or request.if_none_match.contains(version):
+        return '', 304, headers
+    return jsonify({"fixtures": json.loads(row.round_results), "version": int(version)}), 200, headers
 
 class GameweekStats(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -180,23 +216,22 @@ class League(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(150), nullable=False)
-    user_ids = db.Column(db.Text,default='[]')
+    user_ids = db.Column(db.Text)  # legacy JSON member list; moved into LeagueMember at startup, then cleared
+    members = db.relationship('LeagueMember', backref='league', lazy='dynamic', cascade='all, delete-orphan')
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
-    def add_user_id(self, user_id):
-        if self.user_ids:
-            user_ids = json.loads(self.user_ids)
-        else:
-            user_ids = []
+    def has_member(self, user_id):
+        return db.session.query(LeagueMember).get((self.id, user_id)) is not None
 
-        user_ids += [user_id]
-        user_ids = list(set(user_ids))
-        self.user_ids = json.dumps(user_ids)
-        db.session.commit()
+    def add_member(self, user_id):
+        """Add a user to the league (no-op if they're already in it). Doesn't commit."""
+        if not self.has_member(user_id):
+            db.session.add(LeagueMember(league_id=self.id, user_id=user_id))
 
 # Initial empty dictionary for game week teams (to be stored in DB)
 class GameWeekTeams(db.Model):
@@ -210,6 +245,8 @@ class GameWeekTeams(db.Model):
     next_start_time_3 = db.Column(db.TIMESTAMP)
     reminder_24h_sent = db.Column(db.Boolean, default=False)
     reminder_1h_sent = db.Column(db.Boolean, default=False)
+    results_hash = db.Column(db.String(40))  # sha1 of the stored round_results, to skip no-op writes
+    results_version = db.Column(db.Integer, default=0)  # bumped on every change; never goes back
 
 class PodcastRelease(db.Model):
     __tablename__ = "podcast_release"
@@ -252,78 +289,107 @@ class User(UserMixin, db.Model):
     gold = db.Column(db.Integer, default=400)
     team_choice = db.Column(db.String(50))  # Nullable by default, starts as None
     locked_team_choice = db.Column(db.String(50))
-    previous_results = db.Column(db.Text)  # JSON string to store previous results
-    delayed_matches = db.Column(db.Text) # JSON string for cancelled matches
-    league_ids = db.Column(db.Text, default='[]')
+    previous_results = db.Column(db.Text)  # legacy JSON history; moved into Pick at startup, then cleared
+    delayed_matches = db.Column(db.Text) # legacy JSON list of postponed picks; moved into PendingPick at startup, then cleared
+    league_ids = db.Column(db.Text)  # legacy JSON list of leagues; moved into LeagueMember at startup, then cleared
     doubleup = db.Column(db.Boolean, default=False)
     doubleupsleft = db.Column(db.Integer, default = 2)
-    rank = db.Column(db.Integer, default = 1)
+    rank = db.Column(db.Integer, default = 1)  # 1 + users with a higher score; set by _refresh_ranks()
     GD_bonus = db.Column(db.Boolean, default=False)
     GD_bonus_left = db.Column(db.Integer, default = 1)
     gd = db.Column(db.Integer,default = 0)
     handicap_bonus = db.Column(db.Boolean, default=False)
     handicap_bonus_left = db.Column(db.Integer, default = 1)
     fcm_token = db.Column(db.String(500))
+    password_changed_at = db.Column(db.TIMESTAMP)  # stamped into refresh tokens; see _token_revoked
+    picks = db.relationship('Pick', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    pending_picks = db.relationship('PendingPick', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    league_memberships = db.relationship('LeagueMember', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    # Standings order (score, gold, id, all descending), read backwards for keyset pagination;
+    # and the users still to pick this round, which is who the reminders go to
+    __table_args__ = (
+        db.Index('ix_user_score_gold_id', 'score', 'gold', 'id'),
+        db.Index('ix_user_no_pick', 'id', postgresql_where=db.text('team_choice IS NULL'),
+                 sqlite_where=db.text('team_choice IS NULL')),
+    )
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
+        self.password_changed_at = datetime.utcnow()  # voids the refresh tokens issued before
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
-    def add_previous_result(self, team, score):
-        if self.previous_results:
-            previous_results_dict = json.loads(self.previous_results)
-        else:
-            previous_results_dict = {}
-
-        # Add new result
-        round_number = len(previous_results_dict) + 1
-        previous_results_dict[round_number] = {'team': team, 'score': score}
-
-        # Update and save to database
-        self.previous_results = json.dumps(previous_results_dict)
-        db.session.commit()
-
-    def add_delayed_matches(self, team, double_jeopardy, gd_bonus, handicap_bonus):
-        if self.delayed_matches:
-            delayed_matches_list = json.loads(self.delayed_matches)
-        else:
-            delayed_matches_list = []
-
-        # Add new result
-        output = {"team":team,"DJ":double_jeopardy,"GD":gd_bonus, "HB":handicap_bonus}
-        if delayed_matches_list is None:
-            delayed_matches_list = [output]
-        else:
-            delayed_matches_list+=[output]
-
-        # Update and save to database
-        self.delayed_matches = json.dumps(delayed_matches_list)
-        db.session.commit()
-
-    def remove_delayed_matches(self, team):
-        if self.delayed_matches:
-            delayed_matches_list = json.loads(self.delayed_matches)
-        else:
-            delayed_matches_list = []
-
-        delayed_matches_list = [d for d in delayed_matches_list if d.get('team') != team]
-
-        self.delayed_matches = json.dumps(delayed_matches_list)
-        db.session.commit()
-
-    def add_league_id(self, league_id):
-        if self.league_ids:
-            league_ids = json.loads(self.league_ids)
-        else:
-            league_ids = []
-
-        league_ids += [league_id]
-        league_ids = list(set(league_ids))
-        self.league_ids = json.dumps(league_ids)
-        db.session.commit()
 
+# One scored pick in a user's history. `round` is the pick's position in that history (1, 2, ...),
+# which is also how the round counter counts; a postponed pick is numbered when it's settled.
+class Pick(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    round = db.Column(db.Integer, nullable=False)
+    team_key = db.Column(db.String(50), nullable=False)  # '' = no pick that round
+    score = db.Column(db.Float, nullable=False)
+    bonuses = db.Column(db.String(3), default='')  # '*' double-up, '+' GD bonus, '-' handicap
+    __table_args__ = (db.Index('ix_pick_user_round', 'user_id', 'round'),)
+
+    def result(self):
+        # Same shape (and int-ness of whole scores) as the old previous_results entries
+        score = int(self.score) if self.score.is_integer() else self.score
+        return {'team': self.team_key, 'score': score}
+
+# A locked pick whose match hadn't been played when its round was scored, with the bonuses it
+# was locked with. Settled (turned into a Pick) by the first update_scores that has its result.
+class PendingPick(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    team_key = db.Column(db.String(50), nullable=False, index=True)
+    DJ = db.Column(db.Boolean, default=False)  # double-up
+    GD = db.Column(db.Boolean, default=False)  # GD bonus
+    HB = db.Column(db.Boolean, default=False)  # handicap bonus
+
+# League membership, one row per (league, user). The primary key serves "who is in this league",
+# the reverse index "which leagues is this user in".
+class LeagueMember(db.Model):
+    league_id = db.Column(db.Integer, db.ForeignKey('league.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    __table_args__ = (db.Index('ix_league_member_user_league', 'user_id', 'league_id'),)
+
+# One queued email or push (see dispatch_outbox). dedupe_key names what it's for, e.g.
+# 'result:12:345' (round 12's result push to user 345), so re-running a job can't send it twice.
+class NotificationOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # 'push' or 'email'
+    dedupe_key = db.Column(db.String(120), unique=True, nullable=False)
+    user_id = db.Column(db.Integer)
+    recipient = db.Column(db.String(500), nullable=False)  # FCM token or email address
+    title = db.Column(db.String(200), nullable=False)  # push title / email subject
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending / sent / failed / expired
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.TIMESTAMP)
+    expires_at = db.Column(db.TIMESTAMP)  # not sent after this, e.g. a reminder past the deadline
+    created_at = db.Column(db.TIMESTAMP)
+    sent_at = db.Column(db.TIMESTAMP)
+    last_error = db.Column(db.String(200))
+    __table_args__ = (db.Index('ix_outbox_status_due', 'status', 'next_attempt_at'),)
+
+# Refresh tokens that have been used (rotated) or signed out, until they'd have expired anyway
+class RevokedToken(db.Model):
+    jti = db.Column(db.String(36), primary_key=True)
+    expires_at = db.Column(db.TIMESTAMP, nullable=False, index=True)
+
+# Single-row (id=1) game state: the round counter and the current gameweek's deadlines. Every
+# change bumps `version`, which is what lets each process cache the row (see game_state()).
+class GameState(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    current_round = db.Column(db.Integer, nullable=False, default=1)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    total_users = db.Column(db.Integer, nullable=False, default=0)  # what User.rank is out of
+    start_time = db.Column(db.TIMESTAMP)  # first kick-off; picks lock 30 min before
+    end_time = db.Column(db.TIMESTAMP)
+    next_start_time = db.Column(db.TIMESTAMP)
+    next_start_time_2 = db.Column(db.TIMESTAMP)
+    next_start_time_3 = db.Column(db.TIMESTAMP)
 
 # Admin model
 class Admin(UserMixin, db.Model):
@@ -344,14 +410,181 @@ with app.app_context():
     try:
         with db.engine.connect() as _conn:
             _conn.execute(db.text('ALTER TABLE "user" ADD COLUMN IF NOT EXISTS fcm_token VARCHAR(500)'))
+            _conn.execute(db.text('ALTER TABLE "user" ADD COLUMN IF NOT EXISTS password_changed_at TIMESTAMP'))
             _conn.execute(db.text('ALTER TABLE game_week_teams ADD COLUMN IF NOT EXISTS next_start_time_2 TIMESTAMP'))
             _conn.execute(db.text('ALTER TABLE game_week_teams ADD COLUMN IF NOT EXISTS next_start_time_3 TIMESTAMP'))
             _conn.execute(db.text('ALTER TABLE game_week_teams ADD COLUMN IF NOT EXISTS reminder_24h_sent BOOLEAN DEFAULT FALSE'))
             _conn.execute(db.text('ALTER TABLE game_week_teams ADD COLUMN IF NOT EXISTS reminder_1h_sent BOOLEAN DEFAULT FALSE'))
+            _conn.execute(db.text('ALTER TABLE game_week_teams ADD COLUMN IF NOT EXISTS results_hash VARCHAR(40)'))
+            _conn.execute(db.text('ALTER TABLE game_week_teams ADD COLUMN IF NOT EXISTS results_version INTEGER DEFAULT 0'))
+            _conn.execute(db.text('ALTER TABLE game_state ADD COLUMN IF NOT EXISTS total_users INTEGER NOT NULL DEFAULT 0'))
+            _conn.execute(db.text('ALTER TABLE notification_outbox ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP'))
+            _conn.execute(db.text('CREATE INDEX IF NOT EXISTS ix_user_score_gold_id ON "user" (score, gold, id)'))
+            _conn.execute(db.text('CREATE INDEX IF NOT EXISTS ix_user_no_pick ON "user" (id) WHERE team_choice IS NULL'))
             _conn.commit()
     except Exception:
         pass
 
+    # One-time move of the previous_results JSON blobs into Pick rows. Each blob is cleared in
+    # the same transaction, and the rows are locked, so concurrent workers can't copy one twice.
+    try:
+        _rows = db.session.query(User.id, User.previous_results).filter(User.previous_results.isnot(None)).with_for_update().all()
+        if _rows:
+            _picks = []
+            for _uid, _blob in _rows:
+                for _key, _result in (json.loads(_blob) if _blob else {}).items():
+                    _picks.append({'user_id': _uid, 'round': int(_key), 'team_key': _result['team'] or '',
+                                   'score': _result['score'], 'bonuses': ''})
+            db.session.bulk_insert_mappings(Pick, _picks)
+            User.query.filter(User.id.in_([_uid for _uid, _ in _rows])).update(
+                {User.previous_results: None}, synchronize_session=False)
+            db.session.commit()
+            logger.info(f"Migrated {len(_picks)} picks from previous_results for {len(_rows)} users")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"previous_results -> Pick migration failed: {e}")
+
+    # Same for the delayed_matches lists -> PendingPick rows, keeping their order
+    try:
+        _rows = db.session.query(User.id, User.delayed_matches).filter(User.delayed_matches.isnot(None)).with_for_update().all()
+        if _rows:
+            _pending = []
+            for _uid, _blob in _rows:
+                for _match in (json.loads(_blob) if _blob else None) or []:
+                    if _match is not None:
+                        _pending.append({'user_id': _uid, 'team_key': _match['team'],
+                                         'DJ': _match['DJ'], 'GD': _match['GD'], 'HB': _match['HB']})
+            db.session.bulk_insert_mappings(PendingPick, _pending)
+            User.query.filter(User.id.in_([_uid for _uid, _ in _rows])).update(
+                {User.delayed_matches: None}, synchronize_session=False)
+            db.session.commit()
+            logger.info(f"Migrated {len(_pending)} pending picks from delayed_matches for {len(_rows)} users")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"delayed_matches -> PendingPick migration failed: {e}")
+
+    # Same for league membership, which was kept twice (League.user_ids and User.league_ids):
+    # the union of both lists becomes LeagueMember rows, skipping ids that no longer exist
+    try:
+        _leagues = db.session.query(League.id, League.user_ids).filter(League.user_ids.isnot(None)).with_for_update().all()
+        _users = db.session.query(User.id, User.league_ids).filter(User.league_ids.isnot(None)).with_for_update().all()
+        if _leagues or _users:
+            _pairs = set()
+            for _lid, _blob in _leagues:
+                _pairs.update((_lid, _uid) for _uid in (json.loads(_blob) if _blob else None) or [])
+            for _uid, _blob in _users:
+                _pairs.update((_lid, _uid) for _lid in (json.loads(_blob) if _blob else None) or [])
+            _league_ids = {_lid for (_lid,) in db.session.query(League.id)}
+            _user_ids = {_uid for (_uid,) in db.session.query(User.id)}
+            _pairs -= {(_lid, _uid) for (_lid, _uid) in db.session.query(LeagueMember.league_id, LeagueMember.user_id)}
+            _members = [{'league_id': _lid, 'user_id': _uid} for _lid, _uid in _pairs
+                        if _lid in _league_ids and _uid in _user_ids]
+            db.session.bulk_insert_mappings(LeagueMember, _members)
+            League.query.filter(League.id.in_([_lid for _lid, _ in _leagues])).update(
+                {League.user_ids: None}, synchronize_session=False)
+            User.query.filter(User.id.in_([_uid for _uid, _ in _users])).update(
+                {User.league_ids: None}, synchronize_session=False)
+            db.session.commit()
+            logger.info(f"Migrated {len(_members)} league memberships for {len(_leagues)} leagues / {len(_users)} users")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"user_ids/league_ids -> LeagueMember migration failed: {e}")
+
+def _pick_history(user_id):
+    """A user's scored picks as {'1': {'team', 'score'}, ...} (the old previous_results shape)."""
+    picks = Pick.query.filter_by(user_id=user_id).order_by(Pick.round)
+    return {str(pick.round): pick.result() for pick in picks}
+
+def _count_current_round():
+    """The round being played, worked out from the history. The admin account scores every round,
+    so it's the admin's history length + 1; while it has postponed picks, those count instead of
+    the +1. Only scoring and startup need this; everything else reads game_state()."""
+    admin_id = db.session.query(User.id).filter_by(username='admin').scalar()
+    played = Pick.query.filter_by(user_id=admin_id).count()
+    if played == 0:
+        return 1
+    pending = PendingPick.query.filter_by(user_id=admin_id).count()
+    if pending:
+        return played + pending
+    return played + 1
+
+def _refresh_ranks():
+    """Store every user's leaderboard rank: RANK() over score, so ties share a rank and the next
+    one skips (1, 2, 2, 4), i.e. 1 + the number of users with a higher score. The database ranks
+    in one windowed SELECT; only the rows whose rank moved are written back, in the caller's
+    transaction. Returns how many moved."""
+    ranked = db.session.query(
+        User.id, User.rank,
+        func.rank().over(order_by=User.score.desc().nullslast()),
+    )
+    moved = [{'id': uid, 'rank': new} for uid, old, new in ranked if old != new]
+    db.session.bulk_update_mappings(User, moved)
+    return len(moved)
+
+_GAME_STATE_COLUMNS = ('current_round', 'version', 'total_users', 'start_time', 'end_time',
+                       'next_start_time', 'next_start_time_2', 'next_start_time_3')
+GameStateSnapshot = namedtuple('GameStateSnapshot', _GAME_STATE_COLUMNS)
+_game_state_cache = None  # the last GameStateSnapshot this process read
+
+def _ensure_game_state():
+    """Create the GameState row from the history and the gameweek row if it doesn't exist yet
+    (ranking everyone for the first time along with it)."""
+    if db.session.query(GameState.id).filter_by(id=1).scalar() is not None:
+        return
+    gameweek_teams = GameWeekTeams.query.first()
+    times = {col: getattr(gameweek_teams, col) if gameweek_teams else None for col in _GAME_STATE_COLUMNS[3:]}
+    _refresh_ranks()
+    db.session.add(GameState(id=1, current_round=_count_current_round(), version=1,
+                             total_users=User.query.count(), **times))
+    db.session.commit()
+
+def game_state():
+    """The current round and deadlines. Costs one single-integer version probe; the row itself is
+    only re-read (and re-cached for this process) when another write has bumped the version."""
+    global _game_state_cache
+    version = db.session.query(GameState.version).filter_by(id=1).scalar()
+    cached = _game_state_cache
+    if cached is not None and version is not None and cached.version == version:
+        return cached
+    if version is None:
+        _ensure_game_state()
+    row = db.session.query(*[getattr(GameState, col) for col in _GAME_STATE_COLUMNS]).filter_by(id=1).one()
+    _game_state_cache = GameStateSnapshot(*row)
+    return _game_state_cache
+
+def _advance_game_state(**values):
+    """Set GameState columns and bump its version as one UPDATE, inside the caller's transaction
+    (so it commits, or rolls back, together with the change it describes)."""
+    _ensure_game_state()
+    changes = {getattr(GameState, col): value for col, value in values.items()}
+    changes[GameState.version] = GameState.version + 1
+    GameState.query.filter_by(id=1).update(changes, synchronize_session=False)
+
+def _current_round():
+    return game_state().current_round
+
+def _join_ranking(user):
+    """Give a new user a provisional rank (1 + users with a higher score) rather than the default
+    1. Nobody else's rank, nor total_users, changes until the next scoring run re-ranks everyone:
+    shifting them here would be a write over all lower-ranked users per sign-up."""
+    user.rank = User.query.filter(User.score > (user.score or 0.0)).count() + 1
+
+with app.app_context():
+    try:
+        _ensure_game_state()
+    except Exception as e:  # e.g. another worker created it first
+        db.session.rollback()
+        logger.warning(f"GameState init skipped: {e}")
+    # Rows created before total_users existed: rank everyone once now rather than at the next scoring
+    try:
+        if GameState.query.filter_by(id=1, total_users=0).with_for_update().first() and User.query.first():
+            _refresh_ranks()
+            _advance_game_state(total_users=User.query.count())
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Initial ranking skipped: {e}")
+
 @login_manager.user_loader
 def load_user(user_id):
     # Check if user is an Admin
@@ -361,16 +594,61 @@ def load_user(user_id):
     else:
         return Admin.query.get(int(user_id))
 
+def _password_stamp(changed_at):
+    return changed_at.isoformat() if changed_at else None
+
+def _refresh_token_for(user, auth_time=None):
+    """A refresh token carrying when the user's password last changed, so changing or resetting
+    it (or deleting the account, and so a later sign-up under the same name) voids it. Rotation
+    passes on `auth_time`, the original sign-in, which caps the chain at REFRESH_SESSION_MAX_AGE."""
+    return create_refresh_token(identity=user.username, additional_claims={
+        'pwd': _password_stamp(user.password_changed_at),
+        'auth_time': auth_time or int(time.time()),
+    })
+
+@jwt.token_in_blocklist_loader
+def _token_revoked(jwt_header, jwt_payload):
+    # Only refresh tokens can be revoked; access tokens skip the lookup
+    if jwt_payload.get('type') != 'refresh':
+        return False
+    if time.time() - jwt_payload.get('auth_time', jwt_payload['iat']) > REFRESH_SESSION_MAX_AGE.total_seconds():
+        return True
+    account = db.session.query(User.password_changed_at).filter_by(username=jwt_payload['sub']).first()
+    if account is None or _password_stamp(account.password_changed_at) != jwt_payload.get('pwd'):
+        return True
+    return db.session.query(RevokedToken.jti).filter_by(jti=jwt_payload['jti']).scalar() is not None
+
+def _revoke_token(jwt_payload):
+    """Blocklist a refresh token until its expiry, dropping entries that have expired. Returns
+    False if it was already revoked (e.g. two launches raced with the same token)."""
+    now = datetime.utcnow()
+    try:
+        RevokedToken.query.filter(RevokedToken.expires_at < now).delete(synchronize_session=False)
+        db.session.add(RevokedToken(jti=jwt_payload['jti'], expires_at=datetime.utcfromtimestamp(jwt_payload['exp'])))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
 
 def add_results_to_gameweek(results):
+    """Store the live round scores. Skips the write when they're unchanged since the last call;
+    otherwise bumps results_version. Returns True if anything was written."""
     gameweek_teams = GameWeekTeams.query.first()
 
     if gameweek_teams:
-        # Assuming there's a column named `results_json` to store JSON data
+        digest = hashlib.sha1(json.dumps(results, sort_keys=True).encode('utf-8')).hexdigest()
+        if digest == gameweek_teams.results_hash:
+            return False
         gameweek_teams.round_results = json.dumps(results)  # Convert Python dict to JSON string
+        gameweek_teams.results_hash = digest
+        gameweek_teams.results_version = func.coalesce(GameWeekTeams.results_version, 0) + 1  # atomic across workers
         db.session.commit()  # Save changes to the database
+        return True
     else:
         print("No GameWeekTeams entry found.")
+        return False
 
 
 # Function to update game week teams in DB
@@ -391,7 +669,11 @@ def update_gameweek_teams(data, start_gameweek, end_gameweek, next_start_gamewee
         else:
             new_gameweek_teams = GameWeekTeams(data=json.dumps(data),start_time = start_gameweek, end_time = end_gameweek, next_start_time = next_start_gameweek)
         db.session.add(new_gameweek_teams)
+        gameweek_teams = new_gameweek_teams
+    _advance_game_state(start_time=gameweek_teams.start_time, end_time=gameweek_teams.end_time,
+                        next_start_time=gameweek_teams.next_start_time)
     db.session.commit()
+    scheduler.poke()  # deadlines moved — re-plan the next wake-up
 
 # Function to read current game week teams from D
 def read_current_gameweek_teams():
@@ -404,41 +686,69 @@ def read_current_gameweek_teams():
     else:
         return {}
 
+# Dashboard view of this gameweek's teams, rebuilt only when the game-state version moves (every
+# teams write goes through update_gameweek_teams, which bumps it): `teams` is the stored
+# {key: gold} dict (don't mutate it), `display[doubled]` the {display name: price} dict the
+# dashboards show, prices x2 for double-up users, and `json[doubled]` the same pre-serialized.
+TeamsPayload = namedtuple('TeamsPayload', 'teams display json')
+_teams_cache = None  # (game-state version, TeamsPayload)
+
+def current_teams():
+    global _teams_cache
+    version = game_state().version
+    cached = _teams_cache
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    teams = read_current_gameweek_teams()
+    display = {
+        False: {transform_match_string(key): value for key, value in teams.items()},
+        True: {transform_match_string(key): 2 * value for key, value in teams.items()},
+    }
+    payload = TeamsPayload(teams, display, {d: flask_json.dumps(v, separators=(',', ':')) for d, v in display.items()})
+    _teams_cache = (version, payload)
+    return payload
+
+_TEAMS_PLACEHOLDER = '\x00teams\x00'
+
+def _dashboard_response(fields, doubled, status=200):
+    """What jsonify({**fields, 'teams': <display teams>}) returns, with the teams spliced in from
+    the cached fragment instead of rebuilt and re-encoded on every request."""
+    body = flask_json.dumps({**fields, 'teams': _TEAMS_PLACEHOLDER}, separators=(',', ':'))
+    body = body.replace(flask_json.dumps(_TEAMS_PLACEHOLDER), current_teams().json[bool(doubled)], 1)
+    return app.response_class(body + '\n', status=status, mimetype=app.config['JSONIFY_MIMETYPE'])
+
 def give_gold(amount):
     users = User.query.all()
     for user in users:
         user.gold += amount
 
 def lock_team_choices():
+    """Lock every user's pick at the deadline with four set-based UPDATEs in one transaction:
+    unaffordable picks lock as None, affordable ones are charged (twice with double-up when the
+    user can cover it, otherwise double-up is dropped), no pick locks as '' with a 1-gold penalty,
+    then every team_choice is cleared. Prices come from this gameweek's teams as an inline CASE."""
     teams = read_current_gameweek_teams()
-    user_ids = [u.id for u in User.query.all()]
-    for uid in user_ids:
-        # Row-level lock prevents concurrent gold deduction race
-        user = User.query.with_for_update().get(uid)
-        if user is None:
-            continue
-        if user.team_choice is not None:
-            cost = teams.get(user.team_choice, 0)
-            if cost > 0 and user.gold >= cost:
-                user.gold -= cost
-                user.locked_team_choice = user.team_choice
-                if user.doubleup:
-                    if user.gold >= cost:
-                        user.gold -= cost
-                    else:
-                        user.doubleup = False
-            else:
-                user.locked_team_choice = None
-        else:
-            user.locked_team_choice = ''
-            user.gold = max(0, user.gold - 1)  # no-pick penalty, never below 0
-        user.team_choice = None
-        db.session.flush()
-    db.session.commit()
+    cost = case(teams, value=User.team_choice, else_=0) if teams else literal(0)
+    picked = User.team_choice.isnot(None)
+    affordable = and_(picked, cost > 0, User.gold >= cost)
+
+    # Order matters: charging gold in step 2 would change who counts as unaffordable in step 1
+    User.query.filter(picked, not_(affordable)).update(
+        {User.locked_team_choice: None}, synchronize_session=False)
+    User.query.filter(affordable).update({
+        User.locked_team_choice: User.team_choice,
+        User.gold: case((and_(User.doubleup == True, User.gold >= 2 * cost), User.gold - 2 * cost), else_=User.gold - cost),
+        User.doubleup: case((and_(User.doubleup == True, User.gold < 2 * cost), False), else_=User.doubleup),
+    }, synchronize_session=False)
+    User.query.filter(User.team_choice.is_(None)).update({
+        User.locked_team_choice: '',
+        User.gold: case((User.gold > 1, User.gold - 1), else_=0),  # no-pick penalty, never below 0
+    }, synchronize_session=False)
+    User.query.update({User.team_choice: None}, synchronize_session=False)
 
     new_time = datetime.utcnow() + timedelta(days=100)
     teams = {}
-    update_gameweek_teams(teams, new_time, None, None)
+    update_gameweek_teams(teams, new_time, None, None)  # commits the lock along with the gameweek
 
 def points_from_GD(GD):
     if GD>0:
@@ -449,16 +759,136 @@ def points_from_GD(GD):
         score_for_round = 1
     return score_for_round
 
+# Columns update_scores reads and writes per user; loaded as plain rows (no ORM objects,
+# no password hashes) and written back with one executemany.
+_SCORING_COLUMNS = (
+    'id', 'username', 'fcm_token', 'score', 'gd', 'team_choice', 'locked_team_choice',
+    'doubleup', 'doubleupsleft', 'GD_bonus', 'GD_bonus_left', 'handicap_bonus', 'handicap_bonus_left',
+)
+# What scoring writes back. Not username / fcm_token: the app can register a new token mid-run
+# (save_fcm_tokenIOS, _prune_fcm_tokens) and writing the loaded value back would undo it.
+_SCORED_COLUMNS = (
+    'id', 'score', 'gd', 'team_choice', 'locked_team_choice',
+    'doubleup', 'doubleupsleft', 'GD_bonus', 'GD_bonus_left', 'handicap_bonus', 'handicap_bonus_left',
+)
+
+def _bonus_marks(doubleup, gd_bonus, handicap):
+    """The '*' / '+' / '-' marks the league table uses, for the bonuses a pick played with."""
+    return ('*' if doubleup else '') + ('+' if gd_bonus else '') + ('-' if handicap else '')
+
+def _settle_pending(u, settled, winner_scores, picks):
+    """Score the user's postponed picks whose match now has a result. `settled` is their
+    (team_key, DJ, GD, HB) PendingPick rows, oldest first. Updates `u` in place and appends
+    the scored picks to `picks`."""
+    for match, double_jepordy, gd_bonus, handicap_bonus in settled:
+        GD = winner_scores[match]
+        if handicap_bonus:
+            score_for_round = points_from_GD(GD+2)
+        else:
+            score_for_round = points_from_GD(GD)
+        if double_jepordy:
+            score_for_round +=points_from_GD(GD)
+        if gd_bonus:
+            score_for_round += GD
+        if match[0:3] == 'Lei':
+            score_for_round += 0.1
+        u['score'] = round(u['score'] + score_for_round, 1)
+        picks.append((match, score_for_round, _bonus_marks(double_jepordy, gd_bonus, handicap_bonus)))
+        u['gd'] += GD
+
+def _finish_user(u, score_for_round, GD, bonuses, picks):
+    """Record this round's score (or park the pick as pending) and reset the picks.
+    Returns (u, new PendingPick mapping or None)."""
+    pending = None
+    if score_for_round is not None:
+        u['score'] = round(u['score'] + score_for_round, 1)
+        u['gd'] += GD
+        picks.append((u['locked_team_choice'], score_for_round, bonuses))
+    elif u['locked_team_choice'] is not None:
+        pending = {'user_id': u['id'], 'team_key': u['locked_team_choice'],
+                   'DJ': u['doubleup'], 'GD': u['GD_bonus'], 'HB': u['handicap_bonus']}
+    u['team_choice'] = None
+    u['locked_team_choice'] = None
+    return u, pending
+
+def _score_user(user, winner_scores, settled=()):
+    """Apply one round's results to one user's row, in memory.
+
+    `user` is a row with the _SCORING_COLUMNS and `settled` the user's postponed picks that now
+    have a result (see _settle_pending). Scores those, then the locked pick for this round, or
+    parks it as pending if its match hasn't been played. Returns (updated column dict, score for
+    this round or None, new history entries as (team, score, bonus marks) in the order they were
+    scored, new PendingPick mapping or None).
+    """
+    u = dict(zip(_SCORING_COLUMNS, user))
+    picks = []
+
+    ###ADD Previous delayed_matches
+    _settle_pending(u, settled, winner_scores, picks)
+
+    ###Add current round
+    score_for_round = None
+    GD = None
+    used = {'doubleup': False, 'gd_bonus': False, 'handicap': False}
+    if u['locked_team_choice'] in winner_scores:
+        GD = winner_scores[u['locked_team_choice']]
+        if u['handicap_bonus'] and u['handicap_bonus_left'] > 0.5:
+            score_for_round = points_from_GD(GD + 2)
+            u['handicap_bonus_left'] -=1
+            u['handicap_bonus'] = False
+            used['handicap'] = True
+        else:
+            score_for_round = points_from_GD(GD)
+        if u['doubleup'] and u['doubleupsleft'] > 0.5:
+            score_for_round +=points_from_GD(GD)
+            u['doubleupsleft'] -= 1
+            u['doubleup'] = False
+            used['doubleup'] = True
+        if u['GD_bonus'] and u['GD_bonus_left'] > 0.5:
+            score_for_round += GD
+            u['GD_bonus_left'] -= 1
+            u['GD_bonus'] = False
+            used['gd_bonus'] = True
+        if u['locked_team_choice'][0:3] == 'Lei':
+            score_for_round += 0.1
+    elif u['locked_team_choice'] == '':
+        score_for_round = 0
+
+        GD = 0
+    elif u['locked_team_choice'] is not None:
+        if u['doubleup']:
+            u['doubleupsleft'] -= 1
+        if u['GD_bonus']:
+            u['GD_bonus_left'] -= 1
+        if u['handicap_bonus']:
+            u['handicap_bonus_left'] -= 1
+
+    u, pending = _finish_user(u, score_for_round, GD, _bonus_marks(**used), picks)
+    return u, score_for_round, picks, pending
+
+def _result_push(user, score_for_round, current_round):
+    """(token, title, body) for the end-of-round push, or None."""
+    if user.username == 'admin' or not user.fcm_token:
+        return None
+    if score_for_round is None:
+        if user.locked_team_choice is not None:
+            return None  # match postponed — nothing to report yet
+        return (user.fcm_token, f'GW{current_round} Results 📊', 'Scores are in — check your result!')
+    team_name = _team_display(user.locked_team_choice)
+    if score_for_round >= 3:
+        return (user.fcm_token, f'GW{current_round} Result 🏆', f'{team_name} won! +{score_for_round}pts')
+    elif score_for_round >= 1:
+        return (user.fcm_token, f'GW{current_round} Result ⚖️', f'{team_name} drew. +{score_for_round}pt')
+    return (user.fcm_token, f'GW{current_round} Result', f'{team_name} lost. 0pts this week')
+
 # Function to update scores and reset team choices
 def update_scores():
-    admin = User.query.filter_by(username='admin').first()
-    if admin.previous_results is None:
-        current_round = 1
-    else:
-        if admin.delayed_matches is not None:
-            current_round = len(json.loads(admin.previous_results)) +len(json.loads(admin.delayed_matches))
-        else:
-            current_round = len(json.loads(admin.previous_results)) +1
+    """Score the finished round for every user in one transaction: load the round inputs and
+    all users once, compute every user's update in memory, write them back with a single
+    executemany, re-rank everyone and commit once, result pushes included (they go out through
+    the outbox). Returns the phase timings in seconds."""
+    t0 = time.perf_counter()
+    current_round = _current_round()
 
     winner_scores = get_results()
     round_scores = get_round_scores(current_round)
@@ -471,105 +901,63 @@ def update_scores():
     gd_c = {REVERSE_TEAM_MAPS.get(i['team2'], i['team2']):(i['score2']-i['score1']) for i in round_scores}
     gd_for_db = {**gd_c, **gd_b}
     # Find the most recent GameweekStats row with empty points
-    row = GameweekStats.query.filter_by(points='{}').order_by(GameweekStats.id.desc()).first()
-    if row:
-        row.points = json.dumps(scores_for_db)
-        row.goal_difference = json.dumps(gd_for_db)
-
-        db.session.commit()
+    stats_row = GameweekStats.query.filter_by(points='{}').order_by(GameweekStats.id.desc()).first()
+    if stats_row:
+        stats_row.points = json.dumps(scores_for_db)
+        stats_row.goal_difference = json.dumps(gd_for_db)
     else:
         print("No row found with empty points.")
 
-    push_queue = []  # (fcm_token, title, body)
-    users = User.query.all()
+    users = db.session.query(*[getattr(User, col) for col in _SCORING_COLUMNS]).all()
+    # Each user's history length, so new picks continue their numbering
+    last_round = dict(db.session.query(Pick.user_id, func.max(Pick.round)).group_by(Pick.user_id).all())
+    # Postponed picks whose match has now been played, found through the team_key index: this
+    # only touches users who have one
+    settled_teams = list(winner_scores)
+    settled = {}
+    if settled_teams:
+        for pending_row in db.session.query(PendingPick.user_id, PendingPick.team_key, PendingPick.DJ, PendingPick.GD, PendingPick.HB) \
+                .filter(PendingPick.team_key.in_(settled_teams)).order_by(PendingPick.id):
+            settled.setdefault(pending_row.user_id, []).append(
+                (pending_row.team_key, pending_row.DJ, pending_row.GD, pending_row.HB))
+    t1 = time.perf_counter()
+
+    updates = []
+    new_picks = []
+    new_pending = []
+    notifications = []  # NotificationOutbox rows, committed with the scores
     for user in users:
-        print (user,11111111)
-        ###ADD Previous delayed_matches
-        if user.delayed_matches is not None:
-            a = json.loads(user.delayed_matches)
-            if a is not None:
-                for match_dict in json.loads(user.delayed_matches):
-                    if match_dict is not None:
-                        match = match_dict['team']
-                        double_jepordy = match_dict['DJ']
-                        gd_bonus = match_dict['GD']
-                        handicap_bonus = match_dict['HB']
-                        score_for_round = None 
-
-                        if match in winner_scores:
-                            GD = winner_scores[match]
-                            if handicap_bonus:
-                                score_for_round = points_from_GD(GD+2)
-                            else:
-                                score_for_round = points_from_GD(GD)
-                            if double_jepordy:
-                                score_for_round +=points_from_GD(GD)
-                            if gd_bonus:
-                                score_for_round += GD
-                            if match[0:3] == 'Lei':  
-                                score_for_round += 0.1 
-                        if score_for_round is not None:
-                            user.score += score_for_round
-                            user.score = round(user.score, 1)
-                            user.add_previous_result(match, score_for_round)
-                            user.remove_delayed_matches(match)
-                            user.gd += GD
-
-        ###Add current round
-        score_for_round = None 
-        if user.locked_team_choice in winner_scores:
-            GD = winner_scores[user.locked_team_choice]
-            if user.handicap_bonus and user.handicap_bonus_left > 0.5:
-                score_for_round = points_from_GD(GD + 2)
-                user.handicap_bonus_left -=1
-                user.handicap_bonus = False
-            else:
-                score_for_round = points_from_GD(GD)
-            if user.doubleup and user.doubleupsleft > 0.5:
-                score_for_round +=points_from_GD(GD)
-                user.doubleupsleft -= 1          
-                user.doubleup = False  
-            if user.GD_bonus and user.GD_bonus_left > 0.5:
-                score_for_round += GD
-                user.GD_bonus_left -= 1
-                user.GD_bonus = False
-            if user.locked_team_choice[0:3] == 'Lei':
-                score_for_round += 0.1
-        elif user.locked_team_choice == '':
-            score_for_round = 0
-
-            GD = 0
-        else:
-            score_for_round = None
-        if score_for_round is not None:
-            user.score += score_for_round
-            user.gd += GD
-            user.score = round(user.score, 1)
-            user.add_previous_result(user.locked_team_choice, score_for_round)
-            if user.username != 'admin' and user.fcm_token:
-                team_name = _team_display(user.locked_team_choice)
-                if score_for_round >= 3:
-                    push_queue.append((user.fcm_token, f'GW{current_round} Result 🏆', f'{team_name} won! +{score_for_round}pts'))
-                elif score_for_round >= 1:
-                    push_queue.append((user.fcm_token, f'GW{current_round} Result ⚖️', f'{team_name} drew. +{score_for_round}pt'))
-                else:
-                    push_queue.append((user.fcm_token, f'GW{current_round} Result', f'{team_name} lost. 0pts this week'))
-        elif user.locked_team_choice is not None:
-            if user.doubleup:
-                user.doubleupsleft -= 1
-            if user.GD_bonus:
-                user.GD_bonus_left -= 1
-            if user.handicap_bonus:
-                user.handicap_bonus_left -= 1
-            user.add_delayed_matches(user.locked_team_choice, user.doubleup,user.GD_bonus, user.handicap_bonus)
-        elif user.username != 'admin' and user.fcm_token:
-            push_queue.append((user.fcm_token, f'GW{current_round} Results 📊', 'Scores are in — check your result!'))
-        user.team_choice = None
-        user.locked_team_choice = None
+        update, score_for_round, picks, pending = _score_user(user, winner_scores, settled.get(user.id, ()))
+        updates.append({col: update[col] for col in _SCORED_COLUMNS})
+        if pending:
+            new_pending.append(pending)
+        n = last_round.get(user.id) or 0
+        for team_key, score, bonuses in picks:
+            n += 1
+            new_picks.append({'user_id': user.id, 'round': n, 'team_key': team_key, 'score': score, 'bonuses': bonuses})
+        message = _result_push(user, score_for_round, current_round)
+        if message:
+            notifications.append(_notification('push', f'result:{current_round}:{user.id}', user.id, *message))
+    t2 = time.perf_counter()
+
+    db.session.bulk_update_mappings(User, updates)
+    db.session.bulk_insert_mappings(Pick, new_picks)
+    if settled:
+        PendingPick.query.filter(PendingPick.team_key.in_(settled_teams)).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(PendingPick, new_pending)
+    enqueued = enqueue_notifications(notifications)
+    t3 = time.perf_counter()
+    _refresh_ranks()
+    # the admin's new pick moves the round on
+    _advance_game_state(current_round=_count_current_round(), total_users=User.query.count())
     db.session.commit()
+    t4 = time.perf_counter()
+    scheduler.poke()  # deliver the result pushes now rather than at the next wake-up
 
-    for token, title, body in push_queue:
-        send_push(token, title, body)
+    timings = {'users': len(updates), 'load_s': round(t1 - t0, 3), 'compute_s': round(t2 - t1, 3),
+               'write_s': round(t3 - t2, 3), 'rank_s': round(t4 - t3, 3), 'enqueued': enqueued}
+    logger.info(f"update_scores round {current_round}: {timings}")
+    return timings
 
 # Routes
 @app.route('/')
@@ -584,21 +972,9 @@ def index():
 @login_required
 def home(username):
     user = User.query.filter_by(username=username).first()
-    admin = User.query.filter_by(username='admin').first()
-    if admin.previous_results is None:
-        round = 1
-    else:
-        if admin.delayed_matches is not None:
-            round = len(json.loads(admin.previous_results)) +len(json.loads(admin.delayed_matches)) 
-        else:
-            round = len(json.loads(admin.previous_results)) +1 
+    round = _current_round()
 
-    teams = read_current_gameweek_teams()
-    teams_new_string = {}
-    for key,value in teams.items():
-        teams_new_string[transform_match_string(key)] = value
-    if teams is None:
-        teams = {}
+    teams_new_string = current_teams().display[False]
     return render_template('home.html', username=username, score=user.score, gold=user.gold, team_choice=transform_match_string(user.team_choice),locked_team_choice= transform_match_string(user.locked_team_choice), teams=teams_new_string, round = round, doubleup = user.doubleup, doubleupsleft = user.doubleupsleft, gdbonus = user.GD_bonus, gdbonusleft = user.GD_bonus_left)
 
 @app.route('/choose_team', methods=['POST'])
@@ -610,7 +986,7 @@ def choose_team():
         user = current_user
 
         # Get game week teams
-        teams = read_current_gameweek_teams()
+        teams = current_teams().teams
 
         # Check if selected team exists and user has enough gold
         if team_name in teams and user.gold >= teams[team_name]:
@@ -666,6 +1042,7 @@ def signup():
 
         new_user = User(username=username)
         new_user.set_password(password)
+        _join_ranking(new_user)
         db.session.add(new_user)
         db.session.commit()
 
@@ -674,109 +1051,308 @@ def signup():
 
     return render_template('signup.html')
 
-@app.route('/keep-alive')
-def keep_alive():
+# Gameweek jobs (lock, score + rollover, reminders, live scores) run on a background scheduler
+# that sleeps until the next deadline instead of inside the /keep-alive request. Set
+# SCHEDULER_ENABLED=0 on processes that shouldn't schedule (one per host is elected anyway).
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') == '1'
+LIVE_POLL_SECONDS = 60   # live score refresh cadence while a locked round is being played
+JOB_RETRY_SECONDS = 60   # back-off before retrying a job that failed
+
+def _gameweek_windows(gameweek_teams):
+    deadline = gameweek_teams.start_time - timedelta(minutes=30)   # picks lock 30 min before start
+    return deadline, deadline - timedelta(hours=24), deadline - timedelta(hours=1)
+
+def _round_in_play(gameweek_teams, now):
+    # lock_team_choices clears the pickable teams until the next rollover
+    return gameweek_teams.data in (None, '', '{}') and gameweek_teams.end_time is not None and now < gameweek_teams.end_time
+
+def _score_and_rollover():
+    row = GameWeekTeams.query.first()
+    if not row:
+        return "no gameweek"
+    original_end = row.end_time
+    # Claim the round by pushing end_time out — guards against a concurrent run
+    # double-scoring. Restored below if scoring fails, so a transient error retries
+    # on the next tick instead of silently skipping the round forever.
+    row.end_time = datetime.utcnow() + timedelta(days=100)
+    db.session.commit()
+    try:
+        logger.info("End time passed — updating scores and generating new teams")
+        update_scores()
+        generate_teams_auto()
+        return "updated scores"
+    except Exception:
+        db.session.rollback()
+        r = GameWeekTeams.query.first()
+        if r:
+            r.end_time = original_end
+            db.session.commit()
+        raise
+
+def _lock_job():
+    logger.info("Lock window reached — locking team choices")
+    lock_team_choices()
+    return "team choices locked"
+
+def _reminder_24h_job():
+    gameweek_teams = GameWeekTeams.query.first()
+    deadline, _, _ = _gameweek_windows(gameweek_teams)
+    count = sent_reminder_email(expires_at=deadline)
+    gameweek_teams.reminder_24h_sent = True
+    db.session.commit()
+    return count
 
+def _reminder_1h_job():
     gameweek_teams = GameWeekTeams.query.first()
-    if not gameweek_teams:
-        return "I'm alive!", 200
+    deadline, _, _ = _gameweek_windows(gameweek_teams)
+    count = _send_1h_push_reminders(expires_at=deadline)
+    gameweek_teams.reminder_1h_sent = True
+    db.session.commit()
+    return count
 
-    start_time = gameweek_teams.start_time
-    end_time = gameweek_teams.end_time
-    deadline = start_time - pd.Timedelta(minutes=30)   # picks lock 30 min before start
-    reminder_24h = deadline - pd.Timedelta(hours=24)
-    reminder_1h  = deadline - pd.Timedelta(hours=1)
+def _live_scores_job():
+    round = _current_round()
+    results = get_round_scores(round)
+    if results and add_results_to_gameweek(results):
+        logger.info(f"Updated live results for round {round}: {len(results)} fixtures")
+        return len(results)
+    return 0
+
+def _run_job(name, fn):
+    """scheduler.run_job, then roll back if the job failed, so the next job in this tick doesn't
+    start inside its broken transaction."""
+    ok = scheduler.run_job(name, fn)
+    if not ok:
+        db.session.rollback()
+    return ok
+
+def run_scheduled_jobs():
+    """One scheduler tick: run the gameweek job that's due, in the order /keep-alive used to
+    check them, and return the UTC time the scheduler should wake next."""
+    gameweek_teams = GameWeekTeams.query.first()
+    if not gameweek_teams or gameweek_teams.start_time is None:
+        return None
     now = datetime.utcnow()
+    end_time = gameweek_teams.end_time
+    deadline, reminder_24h, reminder_1h = _gameweek_windows(gameweek_teams)
+    retry = now + timedelta(seconds=JOB_RETRY_SECONDS)
 
-    if now > end_time:
-        row = GameWeekTeams.query.first()
-        if not row:
-            return "I'm alive!", 200
-        original_end = row.end_time
-        # Claim the round by pushing end_time out — guards against a concurrent /keep-alive
-        # double-scoring. Restored below if scoring fails, so a transient error retries
-        # next poll instead of silently skipping the round forever.
-        row.end_time = datetime.utcnow() + timedelta(days=100)
-        db.session.commit()
-        try:
-            logger.info("End time passed — updating scores and generating new teams")
-            update_scores()
-            generate_teams_auto()
-            return "updated scores",200
-        except Exception as e:
-            logger.error(f"keep-alive score update failed: {e}", exc_info=True)
-            db.session.rollback()
-            r = GameWeekTeams.query.first()
-            if r:
-                r.end_time = original_end
-                db.session.commit()
-            return f"failed updating scores: {e}", 500
+    if end_time is not None and now > end_time:
+        return now if _run_job('score', _score_and_rollover) else retry
 
     if now > deadline:
-        logger.info("Lock window reached — locking team choices")
-        lock_team_choices()
-        return "team choices locked", 200
+        return now if _run_job('lock', _lock_job) else retry
 
-    # Fire each reminder once, anywhere in its window — robust to ping cadence, no double-sends.
+    # Fire each reminder once, anywhere in its window — no double-sends.
     if reminder_24h <= now < reminder_1h and not gameweek_teams.reminder_24h_sent:
-        count = sent_reminder_email()
-        gameweek_teams.reminder_24h_sent = True
-        db.session.commit()
-        return f"{count} reminders sent (24h)!", 200
+        return now if _run_job('reminder_24h', _reminder_24h_job) else retry
 
     if reminder_1h <= now < deadline and not gameweek_teams.reminder_1h_sent:
-        count = _send_1h_push_reminders()
-        gameweek_teams.reminder_1h_sent = True
-        db.session.commit()
-        return f"{count} push reminders sent (1h)!", 200
-
-    admin = User.query.filter_by(username='admin').first()
-    if admin.previous_results is None:
-        round = 1
-    else:
-        if admin.delayed_matches is not None:
-            round = len(json.loads(admin.previous_results)) +len(json.loads(admin.delayed_matches)) 
-        else:
-            round = len(json.loads(admin.previous_results)) +1 
-    try:
-        results = get_round_scores(round)
-        if results:
-            add_results_to_gameweek(results)
-            logger.info(f"Updated live results for round {round}: {len(results)} fixtures")
-    except Exception as e:
-        logger.warning(f"Failed to fetch live results for round {round}: {e}")
+        return now if _run_job('reminder_1h', _reminder_1h_job) else retry
+
+    events = [deadline]
+    if end_time is not None:
+        events.append(end_time)
+    if not gameweek_teams.reminder_24h_sent:
+        events.append(reminder_24h)
+    if not gameweek_teams.reminder_1h_sent:
+        events.append(reminder_1h)
+    if _round_in_play(gameweek_teams, now):
+        _run_job('live_scores', _live_scores_job)
+        events.append(now + timedelta(seconds=LIVE_POLL_SECONDS))
+    upcoming = [e for e in events if e > now]
+    return min(upcoming) if upcoming else None
+
+def _outbox_tick():
+    """Dispatch the outbox if anything in it is due; return when to look again (None: empty)."""
+    due = db.session.query(func.min(NotificationOutbox.next_attempt_at)).filter(NotificationOutbox.status == 'pending').scalar()
+    if due is None:
+        return None
+    now = datetime.utcnow()
+    if due > now:
+        return due
+    if not _run_job('outbox', dispatch_outbox):
+        return now + timedelta(seconds=JOB_RETRY_SECONDS)
+    return now  # there may be more than one batch
+
+def _scheduler_tick():
+    with app.app_context():
+        try:
+            wakes = [wake for wake in (run_scheduled_jobs(), _outbox_tick()) if wake is not None]
+        finally:
+            invalidate_snapshots()  # pages are shared within a tick, not across ticks
+        return min(wakes) if wakes else None
 
-    return "I'm alive!", 200
+scheduler = Scheduler(_scheduler_tick, lock_path=os.path.join(app.instance_path, 'scheduler.lock'),
+                      retry_sleep=JOB_RETRY_SECONDS)
 
-def sent_reminder_email():
-    count = 0
-    users = User.query.all()
-    for user in users:
-        print (user.username)
-        if user.team_choice is not None:
-            continue
-        if user.username == 'admin':
-            continue
-        if user.email is not None:
-            body = f"""Hello {user.username},
+@app.route('/keep-alive')
+def keep_alive():
+    # O(1) liveness + job status; no DB or scraping here. Also revives the scheduler thread
+    # if it died, so the external pinger still guarantees progress.
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+    return jsonify({"status": "alive", **scheduler.status(), "http": pool_stats(),
+                    "date_parse": date_parse_stats()}), 200
+
+REMINDER_EMAIL = Template("""Hello $username,
                 Reminder that teams will be locked in approximately 23 hours, please choose your team,
                 https://premier-league-predictions-2.onrender.com/
                 Not sure who to pick? Have a look at our experts Golden Three picks https://goldenpicksdotblog.wordpress.com/
                 Best regards
-                The Golden Picks team."""
-            send_email(os.environ['GMAIL_ADDRESS'], os.environ['GMAIL_APP_PASSWORD'], user.email, "Golden Picks Reminder", body)
-            count += 1
-        if user.fcm_token:
-            send_push(user.fcm_token, 'Golden Picks ⏰', 'Deadline in 24 hours — pick your team!')
-    return count
+                The Golden Picks team.""")
+
+REMINDER_CHUNK = 1000  # recipients fetched (and their notifications queued) per round trip
+
+def _reminder_recipients(*contacts):
+    """(id, username, email, fcm_token) of each non-admin user who hasn't picked yet and has at
+    least one of the given contact columns set. Only those four columns are read, through the
+    ix_user_no_pick partial index, and rows are streamed REMINDER_CHUNK at a time."""
+    return db.session.query(User.id, User.username, User.email, User.fcm_token) \
+        .filter(User.team_choice.is_(None), User.username != 'admin', or_(*[col.isnot(None) for col in contacts])) \
+        .order_by(User.id).yield_per(REMINDER_CHUNK)
+
+def _enqueue_reminders(recipients, notifications_for):
+    """Queue notifications_for(user) for each streamed recipient, one bulk insert per chunk."""
+    chunk = []
+    for user in recipients:
+        chunk += notifications_for(user)
+        if len(chunk) >= REMINDER_CHUNK:
+            enqueue_notifications(chunk)
+            chunk = []
+    enqueue_notifications(chunk)
+    db.session.commit()
 
-def _send_1h_push_reminders():
-    count = 0
-    for user in User.query.filter(User.team_choice == None, User.username != 'admin', User.fcm_token != None).all():
-        send_push(user.fcm_token, 'Golden Picks ⏰', '1 hour left — pick your team now!')
-        count += 1
-    return count
-        
+def sent_reminder_email(expires_at=None):
+    """Queue the 24h reminder email and push for everyone who hasn't picked. `expires_at` (the
+    pick deadline) stops a reminder that's still queued then from going out."""
+    round = _current_round()
+    emails = 0
+
+    def notifications_for(user):
+        nonlocal emails
+        notifications = []
+        if user.email is not None:
+            notifications.append(_notification('email', f'reminder_24h:{round}:{user.id}:email', user.id, user.email,
+                                               "Golden Picks Reminder", REMINDER_EMAIL.substitute(username=user.username),
+                                               expires_at=expires_at))
+            emails += 1
+        if user.fcm_token:
+            notifications.append(_notification('push', f'reminder_24h:{round}:{user.id}:push', user.id,
+                                               user.fcm_token, 'Golden Picks ⏰', 'Deadline in 24 hours — pick your team!',
+                                               expires_at=expires_at))
+        return notifications
+
+    _enqueue_reminders(_reminder_recipients(User.email, User.fcm_token), notifications_for)
+    return emails
+
+def _send_1h_push_reminders(expires_at=None):
+    round = _current_round()
+    pushes = 0
+
+    def notifications_for(user):
+        nonlocal pushes
+        pushes += 1
+        return [_notification('push', f'reminder_1h:{round}:{user.id}', user.id,
+                              user.fcm_token, 'Golden Picks ⏰', '1 hour left — pick your team now!',
+                              expires_at=expires_at)]
+
+    _enqueue_reminders(_reminder_recipients(User.fcm_token), notifications_for)
+    return pushes
+
+# Notification outbox. Jobs enqueue their emails and pushes (in their own transaction, so a
+# crash can't half-send a batch) and dispatch_outbox delivers them from the scheduler thread.
+OUTBOX_BATCH = 500         # rows claimed per dispatch
+OUTBOX_MAX_ATTEMPTS = 5    # then the row is marked failed
+OUTBOX_RETRY_SECONDS = 60  # first retry delay, doubled on each further attempt
+OUTBOX_KEEP_DAYS = 30      # finished rows (and so their dedupe keys) are kept this long
+
+def _notification(kind, dedupe_key, user_id, recipient, title, body, expires_at=None):
+    return {'kind': kind, 'dedupe_key': dedupe_key, 'user_id': user_id,
+            'recipient': recipient, 'title': title, 'body': body, 'expires_at': expires_at}
+
+def enqueue_notifications(notifications):
+    """Queue _notification() rows with one bulk insert, skipping dedupe keys that are already
+    queued (or were sent). Doesn't commit. Returns how many were queued."""
+    fresh = {n['dedupe_key']: n for n in notifications}
+    keys = list(fresh)
+    for i in range(0, len(keys), 5000):
+        for (key,) in db.session.query(NotificationOutbox.dedupe_key).filter(NotificationOutbox.dedupe_key.in_(keys[i:i + 5000])):
+            del fresh[key]
+    now = datetime.utcnow()
+    rows = [{**n, 'status': 'pending', 'attempts': 0, 'created_at': now, 'next_attempt_at': now} for n in fresh.values()]
+    db.session.bulk_insert_mappings(NotificationOutbox, rows)
+    return len(rows)
+
+_mailer = None
+
+def _outbox_mailer():
+    """This process's mailer. Kept between dispatches so its per-minute send window carries over."""
+    global _mailer
+    if _mailer is None:
+        _mailer = BulkMailer(os.environ.get('GMAIL_ADDRESS'), os.environ.get('GMAIL_APP_PASSWORD'))
+    return _mailer
+
+def dispatch_outbox(batch_size=OUTBOX_BATCH):
+    """Deliver one batch of due outbox rows: pushes concurrently, emails over one SMTP connection.
+    Failures are retried with exponential back-off; pushes to unregistered tokens are dropped and
+    the tokens forgotten. Rows past their expires_at are marked expired instead of sent. Rows are
+    claimed with SKIP LOCKED, so concurrent dispatchers don't double-send."""
+    now = datetime.utcnow()
+    expired = NotificationOutbox.query.filter(NotificationOutbox.status == 'pending', NotificationOutbox.expires_at <= now) \
+        .update({NotificationOutbox.status: 'expired', NotificationOutbox.last_error: 'expired'}, synchronize_session=False)
+    rows = NotificationOutbox.query.filter(NotificationOutbox.status == 'pending', NotificationOutbox.next_attempt_at <= now) \
+        .order_by(NotificationOutbox.id).limit(batch_size).with_for_update(skip_locked=True).all()
+    if not rows:
+        db.session.commit()
+        return {'sent': 0, 'failed': 0, 'deferred': 0, 'expired': expired, 'pruned': 0}
+
+    outcomes = {}
+    pushes = [row for row in rows if row.kind == 'push']
+    if pushes:
+        if _get_fcm_access_token():  # fetched once here, so the workers all hit the cache
+            stats = push.fan_out([(row.recipient, row.title, row.body) for row in pushes], send_push)
+            outcomes.update(zip([row.id for row in pushes], stats['outcomes']))
+            logger.info(f"Outbox push fan-out: {len(pushes)} in {stats['elapsed_s']} s ({stats['per_s']}/s)")
+        else:
+            outcomes.update((row.id, push.FAILED) for row in pushes)
+    emails = [row for row in rows if row.kind == 'email']
+    deferred = []
+    if emails:
+        # All on one connection, and only as many as the provider's per-minute limit allows right
+        # now: the rest wait in the outbox rather than holding up the scheduler thread
+        mailer = _outbox_mailer()
+        budget = mailer.available()
+        for row in emails[:budget]:
+            outcomes[row.id] = push.SENT if mailer.send(row.recipient, row.title, row.body) else push.FAILED
+        mailer.close()
+        later = now + timedelta(seconds=mailer.wait_seconds())
+        deferred = [{'id': row.id, 'next_attempt_at': later} for row in emails[budget:]]
+
+    sent = [row.id for row in rows if outcomes.get(row.id) == push.SENT]
+    dead = [row for row in rows if outcomes.get(row.id) == push.UNREGISTERED]
+    retries = []
+    for row in rows:
+        if row.id in outcomes and outcomes[row.id] not in (push.SENT, push.UNREGISTERED):
+            attempts = row.attempts + 1
+            retries.append({'id': row.id, 'attempts': attempts, 'last_error': 'send failed',
+                            'status': 'pending' if attempts < OUTBOX_MAX_ATTEMPTS else 'failed',
+                            'next_attempt_at': now + timedelta(seconds=OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1))})
+    if sent:
+        NotificationOutbox.query.filter(NotificationOutbox.id.in_(sent)).update(
+            {NotificationOutbox.status: 'sent', NotificationOutbox.sent_at: now}, synchronize_session=False)
+    if dead:
+        NotificationOutbox.query.filter(NotificationOutbox.id.in_([row.id for row in dead])).update(
+            {NotificationOutbox.status: 'failed', NotificationOutbox.last_error: 'unregistered'}, synchronize_session=False)
+    db.session.bulk_update_mappings(NotificationOutbox, retries + deferred)
+    pruned = _prune_fcm_tokens(list({row.recipient for row in dead}))
+    NotificationOutbox.query.filter(NotificationOutbox.status != 'pending',
+                                    NotificationOutbox.created_at < now - timedelta(days=OUTBOX_KEEP_DAYS)).delete(synchronize_session=False)
+    db.session.commit()
+    result = {'sent': len(sent), 'failed': len(rows) - len(sent) - len(deferred), 'deferred': len(deferred),
+              'expired': expired, 'pruned': pruned}
+    logger.info(f"Outbox dispatch: {result}")
+    return result
 
 
 
@@ -839,7 +1415,7 @@ def previous_results(username):
         flash('User not found.', 'error')
         return redirect(url_for('home', username=current_user.username))
 
-    previous_results_dict = json.loads(user.previous_results or '{}')
+    previous_results_dict = _pick_history(user.id)
 
     return render_template('previous_results.html', username=username, previous_results=previous_results_dict)
 
@@ -852,10 +1428,8 @@ def join_league():
     league = League.query.filter_by(name=league_name).first()
     
     if league and league.check_password(password):
-        user_ids = json.loads(league.user_ids)
-        if current_user.id not in user_ids:
-            current_user.add_league_id(league.id)
-            league.add_user_id(current_user.id)
+        if not league.has_member(current_user.id):
+            league.add_member(current_user.id)
             db.session.commit()
             flash('Successfully joined the league!', 'success')
         else:
@@ -881,6 +1455,7 @@ def register():
         else:
             new_user = User(username=username, email=email)
             new_user.set_password(password)
+            _join_ranking(new_user)
             db.session.add(new_user)
             db.session.commit()
 
@@ -898,16 +1473,12 @@ def _store_next_start_times(current_round):
     gw.next_start_time   = get_round_start_time(current_round + 1)
     gw.next_start_time_2 = get_round_start_time(current_round + 2)
     gw.next_start_time_3 = get_round_start_time(current_round + 3)
+    _advance_game_state(next_start_time=gw.next_start_time, next_start_time_2=gw.next_start_time_2,
+                        next_start_time_3=gw.next_start_time_3)
     db.session.commit()
 
 def generate_teams_auto():
-    current_user = User.query.filter_by(username='admin').first()
-    if current_user.previous_results is None:
-        round = 1
-    elif current_user.delayed_matches is None:
-        round = len(json.loads(current_user.previous_results)) + 1
-    else:
-        round = len(json.loads(current_user.previous_results)) +len(json.loads(current_user.delayed_matches)) 
+    round = _current_round()
 
     # Example function call to generate new game week teams
     new_teams,exp_points, start_gameweek, end_gameweek = get_gameweek_teams(round)
@@ -935,14 +1506,10 @@ def generate_teams_auto():
 @login_required
 def generate_teams():
     if current_user.username == 'admin':
-        if current_user.previous_results is None:
-            round = 1
-        elif current_user.delayed_matches is None:
-            round = len(json.loads(current_user.previous_results)) + 1
-        else:
-            round = len(json.loads(current_user.previous_results)) +len(json.loads(current_user.delayed_matches)) 
+        round = _current_round()
 
         print (round)
+        invalidate_snapshots()  # the admin wants the page as it is now, not the last tick's
         # Example function call to generate new game week teams
         new_teams,exp_points, start_gameweek, end_gameweek = get_gameweek_teams(round)
         update_gameweek_teams(new_teams, start_gameweek, end_gameweek, None)
@@ -997,11 +1564,7 @@ def lock_team_choices_route():
 @app.route('/show_league_scores/<league_id>')
 @login_required
 def show_league_scores(league_id):
-    league = League.query.filter_by(id = league_id).first()
-    user_ids = json.loads(league.user_ids)
-    print (user_ids, type(user_ids))
-    users = [User.query.get(user_id) for user_id in user_ids]
-    print (users)
+    users = User.query.join(LeagueMember).filter(LeagueMember.league_id == league_id).all()
     return render_template('scores.html', users=users)
 
 
@@ -1022,7 +1585,7 @@ def show_leagues(username):
         flash('User not found.', 'error')
         return redirect(url_for('home', username=current_user.username))
 
-    leagues = json.loads(user.league_ids)
+    leagues = [league_id for (league_id,) in db.session.query(LeagueMember.league_id).filter_by(user_id=user.id)]
     return render_template('user_leagues.html',username=username,league_ids = leagues)
 
 @app.route('/create_league', methods=['POST'])
@@ -1065,6 +1628,7 @@ def registerIOS():
     else:
         new_user = User(username=username, email=email)
         new_user.set_password(password)
+        _join_ranking(new_user)
         db.session.add(new_user)
         db.session.commit()
 
@@ -1111,11 +1675,9 @@ def createleagueIOS():
     else:
         new_league = League(name=league_name)
         new_league.set_password(password)
-        new_league.add_user_id(current_user.id)
         db.session.add(new_league)
-        db.session.commit()
-        new_league = League.query.filter_by(name=league_name).first()
-        current_user.add_league_id(new_league.id)
+        db.session.flush()  # assigns new_league.id
+        new_league.add_member(current_user.id)
         db.session.commit()
 
 
@@ -1132,9 +1694,6 @@ def loginIOS():
     data = request.json
     identifier = data.get('username')
     password = data.get('password')
-    admin = User.query.filter_by(username="admin").first()
-    teams = read_current_gameweek_teams()
-    teams_new_string = {}
 
     # First, try to find user by username
     user = User.query.filter_by(username=identifier).first()
@@ -1150,60 +1709,53 @@ def loginIOS():
     if not user.check_password(password):
         return jsonify({"msg": "Invalid password"}), 401
 
-    # Build teams_new_string as before
-    if user.doubleup:
-        for key, value in teams.items():
-            teams_new_string[transform_match_string(key)] = 2 * value
-    else:
-        for key, value in teams.items():
-            teams_new_string[transform_match_string(key)] = value
+    # Prepare tokens and response as before. The refresh token lets the app sign back in on
+    # launch through /refreshTokenIOS, without sending (and us re-hashing) the password.
+    token = create_access_token(identity=user.username)
+    refresh_token = _refresh_token_for(user)
 
-    # Calculate round as before
-    if admin.previous_results is None:
-        round = 1
-    else:
-        if admin.delayed_matches is not None:
-            round = len(json.loads(admin.previous_results)) + len(json.loads(admin.delayed_matches)) 
-        else:
-            round = len(json.loads(admin.previous_results)) + 1
+    return _dashboard_response({
+        'access_token': token,
+        'refresh_token': refresh_token,
+        **_dashboard_fields(user),
+    }, user.doubleup)
 
-    # Prepare token and response as before
-    token = create_access_token(identity=user.username)
+
+def _dashboard_fields(user):
+    """The dashboard the app shows on launch, for loginIOS / refreshIOS / refreshTokenIOS."""
+    state = game_state()
+    round = state.current_round
 
     presented_team_choice = user.locked_team_choice if user.locked_team_choice else user.team_choice
     presented_team_choice_out = TEAM_MAPS.get(presented_team_choice.split('_')[0], presented_team_choice.split('_')[0]) if presented_team_choice else ''
 
-    gameweek_teams = GameWeekTeams.query.first()
-    deadline = str(gameweek_teams.start_time) if gameweek_teams else ""
+    deadline = str(state.start_time) if state.start_time else ""
     deadline_utc = ""
     end_time_utc = ""
-    if gameweek_teams:
-        if gameweek_teams.start_time:
-            deadline_utc = gameweek_teams.start_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-        if gameweek_teams.end_time:
-            end_time_utc = gameweek_teams.end_time.strftime('%Y-%m-%dT%H:%M:%SZ')
+    if state.start_time:
+        deadline_utc = state.start_time.strftime('%Y-%m-%dT%H:%M:%SZ')
+    if state.end_time:
+        end_time_utc = state.end_time.strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    return jsonify({
-        'access_token': token,
+    return {
         'username': user.username,
         'score': user.score,
         'gold': user.gold,
         'team_choice': presented_team_choice_out,
         'round': round,
-        'teams': teams_new_string,
         'doubleup': user.doubleup,
         'doubleupsleft': user.doubleupsleft,
         'goal_difference': user.gd,
         'gd_bonus': user.GD_bonus,
         'gd_bonusleft': user.GD_bonus_left,
         'handicap_bonus': user.handicap_bonus,
-        'handicap_bonus_left':user.handicap_bonus_left,
+        'handicap_bonus_left': user.handicap_bonus_left,
         'deadline': deadline,
         'deadline_utc': deadline_utc,
         'end_time_utc': end_time_utc,
-        'rank': User.query.filter(User.score > user.score).count() + 1,
-        'total_users': User.query.count(),
-    }), 200
+        'rank': user.rank,
+        'total_users': max(state.total_users, user.rank or 0),  # signed up since the last scoring run
+    }
 
 
 @app.route('/refreshIOS', methods=['POST'])
@@ -1213,52 +1765,37 @@ def refreshIOS():
     user = User.query.filter_by(username=get_jwt_identity()).first()
     if not user:
         return jsonify({"msg": "User not found"}), 404
-    admin = User.query.filter_by(username='admin').first()
 
-    teams = read_current_gameweek_teams()
-    mult = 2 if user.doubleup else 1
-    teams_new_string = {transform_match_string(k): mult * v for k, v in teams.items()}
+    return _dashboard_response(_dashboard_fields(user), user.doubleup)
 
-    if admin is None or admin.previous_results is None:
-        round = 1
-    elif admin.delayed_matches is not None:
-        round = len(json.loads(admin.previous_results)) + len(json.loads(admin.delayed_matches))
-    else:
-        round = len(json.loads(admin.previous_results)) + 1
 
-    presented_team_choice = user.locked_team_choice if user.locked_team_choice else user.team_choice
-    presented_team_choice_out = TEAM_MAPS.get(presented_team_choice.split('_')[0], presented_team_choice.split('_')[0]) if presented_team_choice else ''
+@app.route('/refreshTokenIOS', methods=['POST'])
+@limiter.limit("30 per minute")
+@jwt_required(refresh=True)
+def refreshTokenIOS():
+    """App launch for a signed-in user: trade the refresh token for a new access token and a new
+    refresh token, and return the dashboard like loginIOS does. No password check, so no
+    PBKDF2 hash per launch. The presented refresh token is revoked (rotation): each one works
+    once, and a replayed one is rejected."""
+    user = User.query.filter_by(username=get_jwt_identity()).first()
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+    if not _revoke_token(get_jwt()):
+        return jsonify({"msg": "Token has been revoked"}), 401
 
-    gameweek_teams = GameWeekTeams.query.first()
-    deadline = str(gameweek_teams.start_time) if gameweek_teams else ""
-    deadline_utc = ""
-    end_time_utc = ""
-    if gameweek_teams:
-        if gameweek_teams.start_time:
-            deadline_utc = gameweek_teams.start_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-        if gameweek_teams.end_time:
-            end_time_utc = gameweek_teams.end_time.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return _dashboard_response({
+        'access_token': create_access_token(identity=user.username),
+        'refresh_token': _refresh_token_for(user, get_jwt().get('auth_time')),
+        **_dashboard_fields(user),
+    }, user.doubleup)
 
-    return jsonify({
-        'username': user.username,
-        'score': user.score,
-        'gold': user.gold,
-        'team_choice': presented_team_choice_out,
-        'round': round,
-        'teams': teams_new_string,
-        'doubleup': user.doubleup,
-        'doubleupsleft': user.doubleupsleft,
-        'goal_difference': user.gd,
-        'gd_bonus': user.GD_bonus,
-        'gd_bonusleft': user.GD_bonus_left,
-        'handicap_bonus': user.handicap_bonus,
-        'handicap_bonus_left': user.handicap_bonus_left,
-        'deadline': deadline,
-        'deadline_utc': deadline_utc,
-        'end_time_utc': end_time_utc,
-        'rank': User.query.filter(User.score > user.score).count() + 1,
-        'total_users': User.query.count(),
-    }), 200
+
+@app.route('/revokeTokenIOS', methods=['POST'])
+@jwt_required(refresh=True)
+def revokeTokenIOS():
+    # Sign out: the app's refresh token stops working
+    _revoke_token(get_jwt())
+    return jsonify({"msg": "Token revoked"}), 200
 
 
 @app.route('/choose_teamIOS', methods=['POST'])
@@ -1273,12 +1810,11 @@ def choose_teamIOS():
     if jwt_identity and jwt_identity != username:
         return jsonify({"msg": "Unauthorized"}), 403
 
-    admin = User.query.filter_by(username="admin").first()
 
     # Deadline enforcement — reject picks after lock window (30 min before start)
-    gameweek_teams = GameWeekTeams.query.first()
-    if gameweek_teams and gameweek_teams.start_time:
-        lock_window = gameweek_teams.start_time - timedelta(minutes=30)
+    state = game_state()
+    if state.start_time:
+        lock_window = state.start_time - timedelta(minutes=30)
         if datetime.utcnow() > lock_window:
             return jsonify({"msg": "Deadline has passed. Picks are locked.", "deadline_passed": True}), 403
 
@@ -1294,7 +1830,7 @@ def choose_teamIOS():
         user = User.query.filter_by(email=username).first()
 
         # Get game week teams
-    teams = read_current_gameweek_teams()
+    teams = current_teams().teams
 
         # Check if selected team exists and user has enough gold
     if team_name in teams and user.gold >= teams[team_name]:
@@ -1308,31 +1844,17 @@ def choose_teamIOS():
 
 
 
-    teams_new_string = {}
-    if user.doubleup:
-        for key,value in teams.items():
-            teams_new_string[transform_match_string(key)] = 2*value
-    else:
-        for key,value in teams.items():
-            teams_new_string[transform_match_string(key)] = value
-    if admin.previous_results is None:
-        round = 1
-    else:
-        if admin.delayed_matches is not None:
-            round = len(json.loads(admin.previous_results)) +len(json.loads(admin.delayed_matches)) 
-        else:
-            round = len(json.loads(admin.previous_results)) +1 
+    round = state.current_round
     
     presented_team_choice = user.locked_team_choice if user.locked_team_choice else user.team_choice
     presented_team_choice_out = TEAM_MAPS.get(presented_team_choice.split('_')[0], presented_team_choice.split('_')[0]) if presented_team_choice else ''
-    return jsonify({
+    return _dashboard_response({
         'access_token': "",
         'username': user.username,
         'score': user.score,
         'gold': user.gold,
         'team_choice': presented_team_choice_out,
         'round': round,
-        'teams': teams_new_string, 
         'doubleup':user.doubleup,
         'doubleupsleft':user.doubleupsleft,
         "goal_difference": user.gd,
@@ -1340,7 +1862,7 @@ def choose_teamIOS():
         'gd_bonusleft':user.GD_bonus_left,
         'handicap_bonus': user.handicap_bonus,
         'handicap_bonus_left':user.handicap_bonus_left
-    }), 200
+    }, user.doubleup)
 
 
 
@@ -1354,12 +1876,11 @@ def gd_bonusIOS():
     if jwt_identity and jwt_identity != username:
         return jsonify({"msg": "Unauthorized"}), 403
     gd_bonus = data.get('gd_bonus')
-    admin = User.query.filter_by(username="admin").first()
 
     # Deadline enforcement
-    gameweek_teams = GameWeekTeams.query.first()
-    if gameweek_teams and gameweek_teams.start_time:
-        lock_window = gameweek_teams.start_time - timedelta(minutes=30)
+    state = game_state()
+    if state.start_time:
+        lock_window = state.start_time - timedelta(minutes=30)
         if datetime.utcnow() > lock_window:
             return jsonify({"msg": "Deadline has passed. Picks are locked.", "deadline_passed": True}), 403
 
@@ -1370,33 +1891,17 @@ def gd_bonusIOS():
     if user.GD_bonus_left > 0:
         user.GD_bonus = gd_bonus
     db.session.commit()
-        # Get game week teams
-    teams = read_current_gameweek_teams()
-    teams_new_string = {}
-    if user.doubleup:
-        for key,value in teams.items():
-            teams_new_string[transform_match_string(key)] = 2*value
-    else:
-        for key,value in teams.items():
-            teams_new_string[transform_match_string(key)] = value
-    if admin.previous_results is None:
-        round = 1
-    else:
-        if admin.delayed_matches is not None:
-            round = len(json.loads(admin.previous_results)) +len(json.loads(admin.delayed_matches)) 
-        else:
-            round = len(json.loads(admin.previous_results)) +1 
+    round = state.current_round
     
     presented_team_choice = user.locked_team_choice if user.locked_team_choice else user.team_choice
     presented_team_choice_out = TEAM_MAPS.get(presented_team_choice.split('_')[0], presented_team_choice.split('_')[0]) if presented_team_choice else ''
-    return jsonify({
+    return _dashboard_response({
         'access_token': "",
         'username': user.username,
         'score': user.score,
         'gold': user.gold,
         'team_choice': presented_team_choice_out,
         'round': round,
-        'teams': teams_new_string, 
         'doubleup':user.doubleup,
         'doubleupsleft':user.doubleupsleft,
         "goal_difference": user.gd,
@@ -1404,7 +1909,7 @@ def gd_bonusIOS():
         'gd_bonusleft':user.GD_bonus_left,
         'handicap_bonus': user.handicap_bonus,
         'handicap_bonus_left':user.handicap_bonus_left
-    }), 200
+    }, user.doubleup)
 
 
 
@@ -1424,12 +1929,11 @@ def handicap_bonusIOS():
     if jwt_identity and jwt_identity != username:
         return jsonify({"msg": "Unauthorized"}), 403
     handicap_bonus = data.get('handicap_bonus')
-    admin = User.query.filter_by(username="admin").first()
 
     # Deadline enforcement
-    gameweek_teams = GameWeekTeams.query.first()
-    if gameweek_teams and gameweek_teams.start_time:
-        lock_window = gameweek_teams.start_time - timedelta(minutes=30)
+    state = game_state()
+    if state.start_time:
+        lock_window = state.start_time - timedelta(minutes=30)
         if datetime.utcnow() > lock_window:
             return jsonify({"msg": "Deadline has passed. Picks are locked.", "deadline_passed": True}), 403
 
@@ -1440,33 +1944,17 @@ def handicap_bonusIOS():
     if user.handicap_bonus_left > 0:
         user.handicap_bonus = handicap_bonus
     db.session.commit()
-        # Get game week teams
-    teams = read_current_gameweek_teams()
-    teams_new_string = {}
-    if user.doubleup:
-        for key,value in teams.items():
-            teams_new_string[transform_match_string(key)] = 2*value
-    else:
-        for key,value in teams.items():
-            teams_new_string[transform_match_string(key)] = value
-    if admin.previous_results is None:
-        round = 1
-    else:
-        if admin.delayed_matches is not None:
-            round = len(json.loads(admin.previous_results)) +len(json.loads(admin.delayed_matches)) 
-        else:
-            round = len(json.loads(admin.previous_results)) +1 
+    round = state.current_round
     
     presented_team_choice = user.locked_team_choice if user.locked_team_choice else user.team_choice
     presented_team_choice_out = TEAM_MAPS.get(presented_team_choice.split('_')[0], presented_team_choice.split('_')[0]) if presented_team_choice else ''
-    return jsonify({
+    return _dashboard_response({
         'access_token': "",
         'username': user.username,
         'score': user.score,
         'gold': user.gold,
         'team_choice': presented_team_choice_out,
         'round': round,
-        'teams': teams_new_string, 
         'doubleup':user.doubleup,
         'doubleupsleft':user.doubleupsleft,
         "goal_difference": user.gd,
@@ -1474,7 +1962,7 @@ def handicap_bonusIOS():
         'gd_bonusleft':user.GD_bonus_left,
         'handicap_bonus': user.handicap_bonus,
         'handicap_bonus_left':user.handicap_bonus_left
-    }), 200
+    }, user.doubleup)
 
 
 @app.route('/doubleupIOS', methods=['POST'])
@@ -1486,12 +1974,11 @@ def doubleupOS():
     if jwt_identity and jwt_identity != username:
         return jsonify({"msg": "Unauthorized"}), 403
     doubleup = data.get('doubleUp')
-    admin = User.query.filter_by(username="admin").first()
 
     # Deadline enforcement
-    gameweek_teams = GameWeekTeams.query.first()
-    if gameweek_teams and gameweek_teams.start_time:
-        lock_window = gameweek_teams.start_time - timedelta(minutes=30)
+    state = game_state()
+    if state.start_time:
+        lock_window = state.start_time - timedelta(minutes=30)
         if datetime.utcnow() > lock_window:
             return jsonify({"msg": "Deadline has passed. Picks are locked.", "deadline_passed": True}), 403
 
@@ -1501,33 +1988,17 @@ def doubleupOS():
     if user.doubleupsleft > 0:
         user.doubleup = doubleup
     db.session.commit()
-        # Get game week teams
-    teams = read_current_gameweek_teams()
-    teams_new_string = {}
-    if user.doubleup:
-        for key,value in teams.items():
-            teams_new_string[transform_match_string(key)] = 2*value
-    else:
-        for key,value in teams.items():
-            teams_new_string[transform_match_string(key)] = value
-    if admin.previous_results is None:
-        round = 1
-    else:
-        if admin.delayed_matches is not None:
-            round = len(json.loads(admin.previous_results)) +len(json.loads(admin.delayed_matches)) 
-        else:
-            round = len(json.loads(admin.previous_results)) +1 
+    round = state.current_round
     
     presented_team_choice = user.locked_team_choice if user.locked_team_choice else user.team_choice
     presented_team_choice_out = TEAM_MAPS.get(presented_team_choice.split('_')[0], presented_team_choice.split('_')[0]) if presented_team_choice else ''
-    return jsonify({
+    return _dashboard_response({
         'access_token': "",
         'username': user.username,
         'score': user.score,
         'gold': user.gold,
         'team_choice': presented_team_choice_out,
         'round': round,
-        'teams': teams_new_string, 
         'doubleup':user.doubleup,
         'doubleupsleft':user.doubleupsleft,
         "goal_difference": user.gd,
@@ -1535,7 +2006,7 @@ def doubleupOS():
         'gd_bonusleft':user.GD_bonus_left,
         'handicap_bonus': user.handicap_bonus,
         'handicap_bonus_left':user.handicap_bonus_left
-    }), 200
+    }, user.doubleup)
 
 
 @app.route('/getLeaguesIOS', methods=['POST'])
@@ -1556,11 +2027,10 @@ def get_leaguesIOS():
         user = User.query.filter_by(username=username).first()
         if not user and "@" in username:
             user = User.query.filter_by(email=username).first()
-        user_leagues = json.loads(user.league_ids)
+        # One join through the user's side of the membership index
+        user_leagues_str = [name for (name,) in db.session.query(League.name).join(LeagueMember)
+                            .filter(LeagueMember.user_id == user.id).order_by(League.id)]
 
-        user_leagues_str = [str(League.query.get(id).name)  for id in user_leagues]
-
-        print (user_leagues)
         # Add the global "Worldwide" league
         all_leagues = ["Worldwide"] + user_leagues_str
 
@@ -1592,19 +2062,7 @@ def unregisterIOS():
         if get_jwt_identity() != user.username:
             return jsonify({"message": "Unauthorized"}), 403
 
-        # Get the list of league IDs this user belongs to
-        league_ids = json.loads(user.league_ids) if user.league_ids else []
-
-        for league_id in league_ids:
-            league = League.query.get(league_id)
-            if league:
-                user_ids = json.loads(league.user_ids) if league.user_ids else []
-                if user.id in user_ids:
-                    user_ids.remove(user.id)
-                    league.user_ids = json.dumps(user_ids)
-                    db.session.add(league)  # mark league for update
-
-        # Delete the user
+        # Delete the user (their LeagueMember rows go with them)
         db.session.delete(user)
         db.session.commit()
 
@@ -1674,14 +2132,14 @@ def get_previous_picksIOS():
         user = User.query.filter_by(email=username).first()
     if not user:
         return jsonify({"msg": "User not found"}), 404
-    previous_results_dict = json.loads(user.previous_results or '{}')
+    previous_results_dict = _pick_history(user.id)
     new_results_dict = {}
     for round, round_dict in previous_results_dict.items():
         new_results_dict[round] = {'team':transform_match_string(round_dict['team']),'score':round_dict['score']}
 
-    # Compute live worldwide rank
-    total_users = User.query.count()
-    rank = User.query.filter(User.score > user.score).count() + 1
+    # Worldwide rank as of the last scoring run (see _refresh_ranks)
+    total_users = game_state().total_users
+    rank = user.rank
 
     return jsonify({
         "gold": user.gold,
@@ -1697,60 +2155,131 @@ def get_previous_picksIOS():
     })
 
 
+# League tables sort by score, then gold, then id (newest first) so every row has a unique
+# position: that is what lets a page resume from the last row it showed.
+_STANDINGS_ORDER = (User.score.desc(), User.gold.desc(), User.id.desc())
+_STANDINGS_KEY = tuple_(User.score, User.gold, User.id)
+
+def _standings_query(reverse=False):
+    """Only the columns a league table row needs, in standings order (or bottom-up)."""
+    order = [col.asc() for col in _STANDINGS_KEY] if reverse else _STANDINGS_ORDER
+    return db.session.query(User.id, User.username, User.score, User.gold, User.gd, User.rank, User.locked_team_choice,
+                            User.doubleup, User.GD_bonus, User.handicap_bonus).order_by(*order)
+
+def _standings_cursor(row):
+    return f"{row.score!r}:{row.gold}:{row.id}"
+
+def _parse_standings_cursor(cursor):
+    """(score, gold, id) from a cursor handed out by _standings_cursor, or None if it's malformed."""
+    try:
+        score, gold, user_id = str(cursor).split(':')
+        return float(score), int(gold), int(user_id)
+    except ValueError:
+        return None
+
+def _standings_row(row):
+    team_choice = row.locked_team_choice if row.locked_team_choice is not None else ''
+    if team_choice != '':
+        shortened_team_choice = shorten_match_string(team_choice.split('_')[0])
+        shortened_team_choice += _bonus_marks(row.doubleup, row.GD_bonus, row.handicap_bonus)
+    else:
+        shortened_team_choice = ''
+    return {
+        "username": row.username,
+        "points": round(row.score, 1),
+        "gold": row.gold,
+        "goal_difference": row.gd,
+        "locked_team": shortened_team_choice
+    }
+
 @app.route('/get_league_detailsIOS', methods=['POST'])
 @jwt_required()
 def get_league_details():
+    """One page of a league table. Pass `cursor` (the previous response's next_cursor) to seek
+    straight to the next page through the (score, gold, id) index, or `page` to jump to a page
+    number. Either way only per_page rows are read, and total_pages comes from a stored count."""
     data = request.json
     league_name = data.get("league_name")
 
-
-    page = int(data.get("page", 1))
     per_page = 10  # Number of rows per page
+    query = _standings_query()
     if league_name == "Worldwide":
-        users = User.query.order_by(User.score.desc(), User.gold.desc()).all()  # Fetch all users
+        total_members = game_state().total_users
     else:
         # Fetch league from the database
         league = League.query.filter_by(name=league_name).first()
         if not league:
             return jsonify({"error": "League not found"}), 400
 
-        # Fetch users in the league
-        user_ids = json.loads(league.user_ids) if league.user_ids else []
-        users = User.query.filter(User.id.in_(user_ids)).order_by(User.score.desc(), User.gold.desc()).all()
+        # Only the league's members, through the membership primary key
+        query = query.join(LeagueMember, LeagueMember.user_id == User.id).filter(LeagueMember.league_id == league.id)
+        total_members = league.members.count()
+
+    cursor = data.get("cursor")
+    if cursor:
+        after = _parse_standings_cursor(cursor)
+        if after is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+        query = query.filter(_STANDINGS_KEY < tuple_(*after))
+    else:
+        try:
+            page = max(int(data.get("page", 1)), 1)
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid page"}), 400
+        query = query.offset((page - 1) * per_page)
+    rows = query.limit(per_page).all()
+
+    return jsonify({
+        "members": [_standings_row(row) for row in rows],
+        "total_pages": math.ceil(total_members / per_page),
+        "next_cursor": _standings_cursor(rows[-1]) if len(rows) == per_page else None,
+    })
+
+@app.route('/get_league_aroundIOS', methods=['POST'])
+@jwt_required()
+def get_league_around():
+    """The `k` rows either side of a user's own row in a league table (default: the caller).
+    Two index seeks from the user's (score, gold, id), one up and one down, each reading k rows,
+    so the cost doesn't grow with the league. Worldwide rows also carry the stored rank."""
+    data = request.get_json() or {}
+    league_name = data.get("league_name")
+    username = data.get("username") or get_jwt_identity()
+    try:
+        k = min(max(int(data.get("k", 5)), 1), 50)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid k"}), 400
 
-    # Prepare the paginated member list
-    total_members = len(users)
-    total_pages = math.ceil(total_members / per_page)
-    start_index = (page - 1) * per_page
-    end_index = start_index + per_page
+    user = User.query.filter_by(username=username).first()
+    if not user and username and "@" in username:
+        user = User.query.filter_by(email=username).first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    above, below = _standings_query(reverse=True), _standings_query()
+    if league_name != "Worldwide":
+        league = League.query.filter_by(name=league_name).first()
+        if not league:
+            return jsonify({"error": "League not found"}), 400
+        if not league.has_member(user.id):
+            return jsonify({"error": "User is not in this league"}), 400
+        above, below = [q.join(LeagueMember, LeagueMember.user_id == User.id).filter(LeagueMember.league_id == league.id)
+                        for q in (above, below)]
+
+    me = tuple_(user.score, user.gold, user.id)
+    rows_above = above.filter(_STANDINGS_KEY > me).limit(k).all()[::-1]
+    rows_below = below.filter(_STANDINGS_KEY < me).limit(k).all()
+    rows = rows_above + [_standings_query().filter(User.id == user.id).one()] + rows_below
 
     members = []
-    for user in users[start_index:end_index]:
-        team_choice = user.locked_team_choice if user.locked_team_choice is not None else ''
-        if team_choice != '':
-            #transformed_team_choice = transform_match_string(team_choice)
-            transformed_team_choice = team_choice.split('_')[0]
-
-            shortened_team_choice = shorten_match_string(transformed_team_choice)
-
-            if user.doubleup:
-                shortened_team_choice += '*'
-            if user.GD_bonus:
-                shortened_team_choice += '+'
-            if user.handicap_bonus:
-                shortened_team_choice += '-'
-        else:
-            shortened_team_choice = ''
-        members.append({
-            "username": user.username,
-            "points": round(user.score,1),
-            "gold": user.gold,
-            "goal_difference": user.gd,
-            "locked_team": shortened_team_choice
-        })
+    for row in rows:
+        member = _standings_row(row)
+        if league_name == "Worldwide":
+            member["rank"] = row.rank
+        members.append(member)
     return jsonify({
         "members": members,
-        "total_pages": total_pages
+        "user_index": len(rows_above),
+        "next_cursor": _standings_cursor(rows[-1]) if len(rows_below) == k else None,  # for get_league_detailsIOS
     })
 
 
@@ -1813,59 +2342,31 @@ def inverse_transform_match_string(transformed_string):
 
 
 def send_email(sender_email, sender_password, receiver_email, subject, body):
-    # Set up the SMTP server
-    smtp_server = "smtp.gmail.com"  # For Gmail
-    smtp_port = 587  # Use 465 for SSL, 587 for TLS
-
-    # Create a MIME object
-    message = MIMEMultipart()
-    message['From'] = sender_email
-    message['To'] = receiver_email
-    message['Subject'] = subject
-
-    # Add the email body to the MIME message
-    message.attach(MIMEText(body, 'plain'))
-
-    # Send the email — log failures instead of swallowing them; never raise (callers are best-effort)
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, receiver_email, message.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        logger.error(f"Email to {receiver_email} failed: {e}")
-        return False
+    # One message on its own connection (password resets); reminders go out through the outbox,
+    # which keeps one connection open for the whole batch. Never raises; callers are best-effort.
+    with BulkMailer(sender_email, sender_password) as mailer:
+        return mailer.send(receiver_email, subject, body)
 
 @app.route('/fetchNotificationsIOS')
 def fetchNotificationsIOS():
-    gameweek_teams = GameWeekTeams.query.first()
-    if not gameweek_teams:
+    state = game_state()
+    if state.start_time is None and state.end_time is None:  # no gameweek generated yet
         return jsonify({"start_time": None, "end_time": None, "next_start_time": None,
                         "current_round": None, "future_gameweeks": []})
-    start_time = gameweek_teams.start_time
+    start_time = state.start_time
     if start_time is not None and (start_time - timedelta(days=30)) > datetime.utcnow():
         start_time = None
-    end_time = gameweek_teams.end_time
-    next_start_time = gameweek_teams.next_start_time
+    end_time = state.end_time
+    next_start_time = state.next_start_time
 
-    # Calculate current round
-    admin = User.query.filter_by(username="admin").first()
-    if admin.previous_results is None:
-        current_round = 1
-    else:
-        if admin.delayed_matches is not None:
-            current_round = len(json.loads(admin.previous_results)) + len(json.loads(admin.delayed_matches))
-        else:
-            current_round = len(json.loads(admin.previous_results)) + 1
+    current_round = state.current_round
 
     # Next 3 gameweek start times come from cached DB columns (populated when a gameweek is
     # generated), so this endpoint stays fast and reliable instead of re-scraping on every call.
     future_gameweeks = []
-    for offset, st in ((1, gameweek_teams.next_start_time),
-                       (2, gameweek_teams.next_start_time_2),
-                       (3, gameweek_teams.next_start_time_3)):
+    for offset, st in ((1, state.next_start_time),
+                       (2, state.next_start_time_2),
+                       (3, state.next_start_time_3)):
         if st is not None:
             future_gameweeks.append({
                 "round": current_round + offset,
@@ -1905,10 +2406,8 @@ def register_leagueIOS():
         league = League.query.filter_by(name=league_name).first()
 
         if league and league.check_password(league_password):
-            user_ids = json.loads(league.user_ids)
-            if current_user.id not in user_ids:
-                current_user.add_league_id(league.id)
-                league.add_user_id(current_user.id)
+            if not league.has_member(current_user.id):
+                league.add_member(current_user.id)
                 db.session.commit()
                 return jsonify({"success": True, "message": "OK"}), 200
             else:
@@ -1952,17 +2451,6 @@ def deregister_web():
             return render_template('deregister.html', error="Cannot delete the admin account")
 
         # Perform the same logic as in unregisterIOS
-        league_ids = json.loads(user.league_ids) if user.league_ids else []
-
-        for league_id in league_ids:
-            league = League.query.get(league_id)
-            if league:
-                user_ids = json.loads(league.user_ids) if league.user_ids else []
-                if user.id in user_ids:
-                    user_ids.remove(user.id)
-                    league.user_ids = json.dumps(user_ids)
-                    db.session.add(league)
-
         db.session.delete(user)
         db.session.commit()
         return render_template('deregister.html', success="Account successfully deregistered.")
@@ -2154,6 +2642,13 @@ def support():
     return render_template('support.html')
 
 
+# Started by the first request a server process handles, not on import: scripts that import the
+# app (bench.py, a shell, a migration) then don't start a scheduler thread and bid for the lock
+@app.before_first_request
+def _start_scheduler():
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+
 if __name__ == '__main__':
     #create_database()
     port = int(os.environ.get("PORT", 5000))
@@ -0,0 +1,415 @@
+"""Offline benchmarks for the hot paths. Nothing here touches the network.
+
+    python bench.py parser [fixtures.html results.html]   # default: newest archived pages
+    python bench.py scrape 8 [--at 2025-10-18T12:00]      # scraper entry points replayed from the archive
+    python bench.py lock --users 10000 100000             # deadline lock on a throwaway SQLite DB
+    python bench.py score --users 10000 100000            # end-of-round scoring, same DB
+    python bench.py launch --launches 50                  # app launch: password login vs refresh token
+    python bench.py mail --messages 200 --refused 5       # BulkMailer against a local SMTP sink
+
+parser and scrape read archived pages from SCRAPE_ARCHIVE_DIR (archiving is off unless it's set).
+The DB benchmarks import the app against BENCH_DATABASE_URL (default: a temp SQLite file),
+never DATABASE_URL, so they can't touch a real database.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import scraper
+
+
+def _timeit(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_parser(args):
+    """Per-page round-index build time for each parser backend on recorded pages."""
+    backends = [b for b in scraper._PARSERS if b != 'lxml' or scraper._lxml_available]
+    pages = [(path, 'results' if 'result' in path.lower() else 'fixtures') for path in args.pages]
+    if not pages:
+        for url, kind in ((scraper.FIXTURES_URL, 'fixtures'), (scraper.RESULTS_URL, 'results')):
+            archived = scraper.archived_pages(url)
+            if archived:
+                pages.append((archived[-1][1], kind))
+    for path, kind in pages:
+        if path.endswith('.gz'):
+            text = scraper.read_archived_page(path)
+        else:
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+        indexes = {b: scraper._build_index(text, kind, backend=b) for b in backends}
+        baseline = indexes['html.parser']
+        times = {b: _timeit(lambda b=b: scraper._build_index(text, kind, backend=b), args.repeat) for b in backends}
+        rows = sum(len(v) for v in baseline.values())
+        print(f"{path} ({kind}, {len(baseline)} rounds, {rows} rows)")
+        for b in backends:
+            same = 'ok' if indexes[b] == baseline else 'MISMATCH'
+            print(f"  {b:12s} {times[b] * 1000:8.2f} ms  x{times['html.parser'] / times[b]:5.1f}  {same}")
+
+
+def bench_scrape(args):
+    """Time get_gameweek_teams / get_round_scores / get_results on archived pages.
+    The digest changes only if the scraped output does, so it doubles as a regression check."""
+    calls = (
+        ('get_gameweek_teams', lambda: scraper.get_gameweek_teams(args.round)),
+        ('get_round_scores', lambda: scraper.get_round_scores(args.round)),
+        ('get_results', scraper.get_results),
+    )
+    with scraper.replay(args.at):
+        for name, fn in calls:
+            scraper._snapshots.clear()  # time the parse too, not just the cached lookup
+            t0 = time.perf_counter()
+            out = fn()
+            cold = time.perf_counter() - t0
+            warm = _timeit(fn, args.repeat)
+            digest = hashlib.sha1(json.dumps(out, default=str, sort_keys=True).encode()).hexdigest()[:12]
+            print(f"  {name:20s} cold {cold * 1000:8.2f} ms  warm {warm * 1000:8.2f} ms  digest {digest}")
+
+
+def _bench_app():
+    """Import the app bound to a scratch database, with background jobs off."""
+    os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL') or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    os.environ['SCHEDULER_ENABLED'] = '0'
+    os.environ['SCRAPE_ARCHIVE_DIR'] = ''
+    import app
+    app.app.app_context().push()
+    return app
+
+
+def _seed_users(app, n, teams):
+    """n users with a realistic spread of picks, double-ups and gold (bulk insert, no ORM objects)."""
+    db, User = app.db, app.User
+    db.session.query(app.Pick).delete()
+    db.session.query(app.PendingPick).delete()
+    db.session.query(app.LeagueMember).delete()
+    db.session.query(app.NotificationOutbox).delete()
+    db.session.query(User).delete()
+    picks = list(teams) + [None] * 4 + ['Not_Offered_H']
+    rng = random.Random(n)
+    db.session.execute(User.__table__.insert(), [{
+        'username': f'bench{i}', 'password_hash': 'x', 'score': 0.0, 'gold': rng.randint(0, 60),
+        'team_choice': rng.choice(picks), 'doubleup': rng.random() < 0.2,
+    } for i in range(n)])
+    db.session.commit()
+
+
+def _legacy_lock_team_choices(app):
+    """The per-user SELECT ... FOR UPDATE loop lock_team_choices used to run, for comparison."""
+    db, User = app.db, app.User
+    teams = app.read_current_gameweek_teams()
+    for uid in [u.id for u in User.query.all()]:
+        user = User.query.with_for_update().get(uid)
+        if user.team_choice is not None:
+            cost = teams.get(user.team_choice, 0)
+            if cost > 0 and user.gold >= cost:
+                user.gold -= cost
+                user.locked_team_choice = user.team_choice
+                if user.doubleup:
+                    if user.gold >= cost:
+                        user.gold -= cost
+                    else:
+                        user.doubleup = False
+            else:
+                user.locked_team_choice = None
+        else:
+            user.locked_team_choice = ''
+            user.gold = max(0, user.gold - 1)
+        user.team_choice = None
+        db.session.flush()
+    db.session.commit()
+
+
+def bench_lock(args):
+    """Deadline lock: set-based UPDATEs vs the old per-user loop, at each user count."""
+    app = _bench_app()
+    teams = {f'Team{i}_Team{i ^ 1}_{"H" if i % 2 else "A"}': 20 - i for i in range(20)}
+    start = datetime.utcnow() + timedelta(days=1)
+    variants = [('set-based', app.lock_team_choices)]
+    if not args.no_legacy:
+        variants.append(('per-user loop', lambda: _legacy_lock_team_choices(app)))
+    for n in args.users:
+        for name, fn in variants:
+            _seed_users(app, n, teams)
+            app.update_gameweek_teams(teams, start, start + timedelta(days=1), None)
+            t0 = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - t0
+            print(f"  {n:>8d} users  {name:14s} {elapsed:8.3f} s  ({elapsed / n * 1e6:7.1f} us/user)")
+
+
+def _legacy_score_user(app, u, delayed, winner_scores):
+    """The rules update_scores applied per ORM user before scoring moved to _score_user, on a
+    plain dict of the _SCORING_COLUMNS and the user's delayed_matches list. Returns the dict, the
+    (team, score) history entries added and the delayed matches left."""
+    points_from_GD = app.points_from_GD
+    history = []
+    for match_dict in list(delayed):
+        match = match_dict['team']
+        if match in winner_scores:
+            GD = winner_scores[match]
+            if match_dict['HB']:
+                score_for_round = points_from_GD(GD+2)
+            else:
+                score_for_round = points_from_GD(GD)
+            if match_dict['DJ']:
+                score_for_round += points_from_GD(GD)
+            if match_dict['GD']:
+                score_for_round += GD
+            if match[0:3] == 'Lei':
+                score_for_round += 0.1
+            u['score'] = round(u['score'] + score_for_round, 1)
+            history.append((match, score_for_round))
+            delayed = [d for d in delayed if d['team'] != match]
+            u['gd'] += GD
+
+    score_for_round = None
+    if u['locked_team_choice'] in winner_scores:
+        GD = winner_scores[u['locked_team_choice']]
+        if u['handicap_bonus'] and u['handicap_bonus_left'] > 0.5:
+            score_for_round = points_from_GD(GD + 2)
+            u['handicap_bonus_left'] -= 1
+            u['handicap_bonus'] = False
+        else:
+            score_for_round = points_from_GD(GD)
+        if u['doubleup'] and u['doubleupsleft'] > 0.5:
+            score_for_round += points_from_GD(GD)
+            u['doubleupsleft'] -= 1
+            u['doubleup'] = False
+        if u['GD_bonus'] and u['GD_bonus_left'] > 0.5:
+            score_for_round += GD
+            u['GD_bonus_left'] -= 1
+            u['GD_bonus'] = False
+        if u['locked_team_choice'][0:3] == 'Lei':
+            score_for_round += 0.1
+    elif u['locked_team_choice'] == '':
+        score_for_round = 0
+        GD = 0
+    if score_for_round is not None:
+        u['score'] = round(u['score'] + score_for_round, 1)
+        u['gd'] += GD
+        history.append((u['locked_team_choice'], score_for_round))
+    elif u['locked_team_choice'] is not None:
+        if u['doubleup']:
+            u['doubleupsleft'] -= 1
+        if u['GD_bonus']:
+            u['GD_bonus_left'] -= 1
+        if u['handicap_bonus']:
+            u['handicap_bonus_left'] -= 1
+        delayed = delayed + [{'team': u['locked_team_choice'], 'DJ': u['doubleup'], 'GD': u['GD_bonus'],
+                              'HB': u['handicap_bonus']}]
+    u['team_choice'] = None
+    u['locked_team_choice'] = None
+    return u, history, delayed
+
+
+def _check_scoring(app, n, seed=0):
+    """_score_user against _legacy_score_user on n random users: every bonus flag and count
+    (NULL counts included), 'Lei' teams, no-pick, unplayed picks and postponed picks settling or
+    not, each against fresh results. Where one raises (a NULL count that gets used) the other
+    must raise the same error. Returns the number of disagreeing users."""
+    rng = random.Random(seed)
+    played = ['Leicester_Team1_H', 'Team1_Leicester_A', 'Team2_Team3_H', 'Team3_Team2_A']
+    unplayed = ['Leeds_Team5_H', 'Team5_Leeds_A', 'Leicester_Team6_A']
+    picks = played + unplayed + ['', None]
+
+    def count():
+        return None if rng.random() < 0.05 else rng.randint(0, 3)
+
+    mismatches = 0
+    for i in range(n):
+        winner_scores = {team: rng.randint(-4, 4) for team in played}
+        row = {'id': i, 'username': f'u{i}', 'fcm_token': None, 'score': round(rng.uniform(0, 60), 1),
+               'gd': rng.randint(-20, 20), 'team_choice': None, 'locked_team_choice': rng.choice(picks)}
+        for flag, left in (('doubleup', 'doubleupsleft'), ('GD_bonus', 'GD_bonus_left'),
+                           ('handicap_bonus', 'handicap_bonus_left')):
+            row[flag] = rng.random() < 0.5
+            row[left] = count()
+        delayed = [{'team': rng.choice(played + unplayed), 'DJ': rng.random() < 0.5,
+                    'GD': rng.random() < 0.5, 'HB': rng.random() < 0.5} for _ in range(rng.randint(0, 2))]
+        try:
+            expected = _legacy_score_user(app, dict(row), delayed, winner_scores)
+        except Exception as e:
+            expected = type(e)
+        settled = [(d['team'], d['DJ'], d['GD'], d['HB']) for d in delayed if d['team'] in winner_scores]
+        try:
+            u, _, new_picks, pending = app._score_user(tuple(row[col] for col in app._SCORING_COLUMNS),
+                                                       winner_scores, settled)
+            left = [d for d in delayed if d['team'] not in winner_scores]
+            if pending:
+                left.append({'team': pending['team_key'], 'DJ': pending['DJ'], 'GD': pending['GD'], 'HB': pending['HB']})
+            got = (u, [(team, score) for team, score, _ in new_picks], left)
+        except Exception as e:
+            got = type(e)
+        mismatches += got != expected
+    return mismatches
+
+
+def bench_score(args):
+    """End-of-round update_scores against synthetic results (no scrape), with its phase timings,
+    after checking _score_user against the pre-refactor rules on random users."""
+    app = _bench_app()
+    mismatches = _check_scoring(app, args.check)
+    print(f"  scoring rules vs pre-refactor loop on {args.check} random users: "
+          f"{'ok' if not mismatches else f'{mismatches} MISMATCH'}")
+    teams = {f'Team{i}_Team{i ^ 1}_{"H" if i % 2 else "A"}': 20 - i for i in range(20)}
+    rng = random.Random(0)
+    # Every fixture but the last one played; its two teams end up as delayed matches
+    winner_scores = {}
+    for i in range(0, 18, 2):
+        gd = rng.randint(-3, 3)
+        winner_scores[f'Team{i}_Team{i + 1}_A'] = gd
+        winner_scores[f'Team{i + 1}_Team{i}_H'] = -gd
+    app.get_results = lambda: winner_scores
+    app.get_round_scores = lambda round: []
+    start = datetime.utcnow() - timedelta(days=1)
+    for n in args.users:
+        _seed_users(app, n, teams)
+        app.db.session.add(app.User(username='admin', password_hash='x'))
+        app.update_gameweek_teams(teams, start, start + timedelta(hours=2), None)
+        app.lock_team_choices()
+        app.db.session.commit()
+        t = app.update_scores()
+        total = t['load_s'] + t['compute_s'] + t['write_s'] + t['rank_s']
+        print(f"  {n:>8d} users  load {t['load_s']:7.3f} s  compute {t['compute_s']:7.3f} s  "
+              f"write {t['write_s']:7.3f} s  rank {t['rank_s']:7.3f} s  ({total / n * 1e6:7.1f} us/user)")
+
+
+def bench_launch(args):
+    """CPU per app launch: loginIOS (a PBKDF2 password check) vs refreshTokenIOS (a JWT decode and
+    one blocklist row), both through the test client against the same scratch DB."""
+    app = _bench_app()
+    app.limiter.enabled = False
+    _seed_users(app, 1, {})
+    user = app.User.query.first()
+    user.set_password('bench-password')
+    app.db.session.commit()
+    client = app.app.test_client()
+    refresh_token = client.post('/loginIOS', json={'username': user.username, 'password': 'bench-password'}).json['refresh_token']
+
+    def login():
+        resp = client.post('/loginIOS', json={'username': user.username, 'password': 'bench-password'})
+        assert resp.status_code == 200, resp.status_code
+
+    def refresh():
+        nonlocal refresh_token
+        resp = client.post('/refreshTokenIOS', headers={'Authorization': f'Bearer {refresh_token}'})
+        assert resp.status_code == 200, resp.status_code
+        refresh_token = resp.json['refresh_token']  # rotated: each one works once
+
+    results = {}
+    for name, fn in (('loginIOS', login), ('refreshTokenIOS', refresh)):
+        fn()  # warm up
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        for _ in range(args.launches):
+            fn()
+        results[name] = ((time.process_time() - cpu0) / args.launches, (time.perf_counter() - wall0) / args.launches)
+        cpu, wall = results[name]
+        print(f"  {name:16s} cpu {cpu * 1000:8.2f} ms/launch  wall {wall * 1000:8.2f} ms/launch")
+    print(f"  refreshTokenIOS uses x{results['loginIOS'][0] / results['refreshTokenIOS'][0]:.1f} less CPU per launch")
+
+
+class _SMTPSink(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail: refuses RCPT to addresses starting with 'refused', and
+    counts connections and delivered messages on the server."""
+
+    def _reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self._reply('220 sink ready')
+        while True:
+            line = self.rfile.readline().decode().strip()
+            verb = line[:4].upper()
+            if not line or verb == 'QUIT':
+                self._reply('221 bye')
+                return
+            if verb == 'EHLO':
+                self._reply('250 sink')
+            elif verb == 'RCPT' and '<refused' in line:
+                self._reply('550 no such user')
+            elif verb == 'DATA':
+                self._reply('354 go ahead')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.delivered += 1
+                self._reply('250 queued')
+            else:  # HELO, MAIL, RCPT, RSET, NOOP
+                self._reply('250 ok')
+
+
+def bench_mail(args):
+    """BulkMailer against a local SMTP sink: every message, refused recipients included, should
+    go over the one connection."""
+    import mailer
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPSink)
+    server.daemon_threads = True
+    server.connections = server.delivered = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    receivers = [f'user{i}@example.com' for i in range(args.messages)]
+    for i in range(args.refused):
+        receivers.insert(i * len(receivers) // max(args.refused, 1), f'refused{i}@example.com')
+    t0 = time.perf_counter()
+    with mailer.BulkMailer('bench@example.com', None, host='127.0.0.1', port=server.server_address[1],
+                           starttls=False, per_minute=len(receivers)) as m:
+        sent = sum(m.send(to, 'Golden Picks Reminder', 'Hello') for to in receivers)
+    elapsed = time.perf_counter() - t0
+    server.shutdown()
+    ok = 'ok' if (sent, server.delivered, server.connections) == (args.messages, args.messages, 1) else 'MISMATCH'
+    print(f"  {sent} sent, {len(receivers) - sent} refused, {server.connections} connection(s)  "
+          f"{elapsed * 1000:8.1f} ms  ({len(receivers) / elapsed:7.0f}/s)  {ok}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('parser', help='fixtures/results page parse time per backend')
+    p.add_argument('pages', nargs='*', help='saved fixtures/results HTML pages (.html or archived .html.gz)')
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=bench_parser)
+
+    p = sub.add_parser('scrape', help='scraper entry points replayed from the archive')
+    p.add_argument('round', type=int)
+    p.add_argument('--at', help='replay the newest pages at or before this UTC ISO timestamp')
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=bench_scrape)
+
+    p = sub.add_parser('lock', help='deadline lock_team_choices at several user counts')
+    p.add_argument('--users', type=int, nargs='+', default=[10000, 100000])
+    p.add_argument('--no-legacy', action='store_true', help='skip the slow per-user baseline')
+    p.set_defaults(func=bench_lock)
+
+    p = sub.add_parser('score', help='end-of-round update_scores at several user counts')
+    p.add_argument('--users', type=int, nargs='+', default=[10000, 100000])
+    p.add_argument('--check', type=int, default=20000, help='random users for the scoring rules check')
+    p.set_defaults(func=bench_score)
+
+    p = sub.add_parser('launch', help='CPU per app launch: password login vs refresh token')
+    p.add_argument('--launches', type=int, default=50)
+    p.set_defaults(func=bench_launch)
+
+    p = sub.add_parser('mail', help='BulkMailer against a local SMTP sink')
+    p.add_argument('--messages', type=int, default=200)
+    p.add_argument('--refused', type=int, default=5, help='recipients the sink refuses, mixed in')
+    p.set_defaults(func=bench_mail)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import logging
+import os
+import random
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger('golden_picks.http')
+
+# Upper bound on open connections per host. Requests beyond it wait for a free connection
+# instead of opening throwaway ones, so a push fan-out can't open thousands of sockets.
+POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 16))
+
+# (connect, read) seconds per host; anything else gets DEFAULT_TIMEOUT.
+DEFAULT_TIMEOUT = (5, 15)
+HOST_TIMEOUTS = {
+    'www.betexplorer.com': (5, 15),
+    'oauth2.googleapis.com': (5, 10),
+    'fcm.googleapis.com': (5, 10),
+}
+
+class _JitteredRetry(Retry):
+    """Exponential backoff with full jitter, so retries from parallel callers don't line up.
+
+    A POST (an FCM send, a token grant) is only retried when the server turned it away without
+    acting on it: a refused connection, or a 429/503, after any Retry-After. A read timeout or a
+    5xx may mean it went through, and resending it could deliver the same push twice.
+    """
+    REFUSED_STATUSES = frozenset([429, 503])
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() == 'POST':
+            return status_code in self.REFUSED_STATUSES
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+class _PooledSession(requests.Session):
+    """Session that fills in the per-host timeout when the caller doesn't pass one."""
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', HOST_TIMEOUTS.get(urlsplit(url).hostname, DEFAULT_TIMEOUT))
+        return super().request(method, url, **kwargs)
+
+def _build_session():
+    retry = _JitteredRetry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),  # POST: see _JitteredRetry.is_retry
+        raise_on_status=False,  # hand the last 5xx back to the caller rather than raising
+    )
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=POOL_MAXSIZE, pool_block=True, max_retries=retry)
+    s = _PooledSession()
+    s.mount('https://', adapter)
+    s.mount('http://', adapter)
+    return s
+
+# Shared keep-alive session for BetExplorer, Google OAuth and FCM. Thread-safe for plain requests.
+session = _build_session()
+
+def pool_stats():
+    """Requests sent vs TCP/TLS connections opened through the shared session, per host and total.
+    `reused` is how many requests rode an existing keep-alive connection."""
+    hosts = {}
+    seen = set()
+    for adapter in session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            h = hosts.setdefault(pool.host, {'requests': 0, 'connections': 0})
+            h['requests'] += pool.num_requests
+            h['connections'] += pool.num_connections
+    for h in hosts.values():
+        h['reused'] = max(0, h['requests'] - h['connections'])
+    total = {k: sum(h[k] for h in hosts.values()) for k in ('requests', 'connections', 'reused')}
+    return {'hosts': hosts, **total}
@@ -0,0 +1,143 @@
+import logging
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+logger = logging.getLogger('golden_picks.mail')
+
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') == '1'  # 0 for a local test sink
+# Provider send limit. Gmail throttles (then blocks) accounts that burst, so stay well under it.
+SMTP_PER_MINUTE = int(os.environ.get('SMTP_PER_MINUTE', 30))
+
+
+class BulkMailer:
+    """Sends many messages over one authenticated SMTP connection, at most `per_minute` a minute.
+
+    The connection is opened on the first send and kept until close(); if the server drops it
+    (idle timeout, 421) the send reconnects once and retries. Thread-safe; usable as a context
+    manager, which closes the connection on exit. send() never raises.
+    """
+
+    def __init__(self, sender, password, host=SMTP_HOST, port=SMTP_PORT, starttls=SMTP_STARTTLS,
+                 per_minute=SMTP_PER_MINUTE):
+        self.sender = sender
+        self._password = password
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.per_minute = per_minute
+        self._server = None
+        self._sent_at = deque()  # monotonic times of the sends in the last minute
+        self._lock = threading.Lock()
+        self.connections = 0  # opened so far, for stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def available(self):
+        """How many sends the per-minute limit allows right now."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return max(0, self.per_minute - len(self._sent_at))
+
+    def wait_seconds(self):
+        """Seconds until the per-minute limit allows another send."""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if len(self._sent_at) < self.per_minute:
+                return 0.0
+            return self._sent_at[0] + 60 - now
+
+    def send(self, receiver, subject, body):
+        """Send one plain-text email, waiting for the rate limit if need be. Returns True if sent."""
+        message = MIMEMultipart()
+        message['From'] = self.sender
+        message['To'] = receiver
+        message['Subject'] = subject
+        message.attach(MIMEText(body, 'plain'))
+        with self._lock:
+            self._throttle()
+            for attempt in (1, 2):
+                try:
+                    if self._server is None:
+                        self._connect()
+                    self._server.sendmail(self.sender, receiver, message.as_string())
+                    self._sent_at.append(time.monotonic())
+                    return True
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    # This message was refused, not the connection: smtplib has RSET it, keep going
+                    if isinstance(e, smtplib.SMTPRecipientsRefused) or e.smtp_code != 421:
+                        logger.error(f"Email to {receiver} failed: {e}")
+                        return False
+                    error = e  # 421: the server is closing the connection
+                except smtplib.SMTPServerDisconnected as e:
+                    error = e
+                except smtplib.SMTPResponseException as e:
+                    if e.smtp_code != 421:  # e.g. login refused: retrying won't help
+                        self._drop()
+                        logger.error(f"Email to {receiver} failed: {e}")
+                        return False
+                    error = e
+                except smtplib.SMTPException as e:
+                    self._drop()  # unknown state: start the next message on a fresh connection
+                    logger.error(f"Email to {receiver} failed: {e}")
+                    return False
+                except OSError as e:  # network error (SMTPException subclasses OSError, hence last)
+                    error = e
+                # The connection died (or never came up): start over on a fresh one, once
+                self._drop()
+                if attempt == 2:
+                    logger.error(f"Email to {receiver} failed: {error}")
+                    return False
+        return False
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._server = None
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self._password:
+                server.login(self.sender, self._password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self.connections += 1
+
+    def _drop(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            except OSError:
+                pass
+            self._server = None
+
+    def _expire(self, now):
+        while self._sent_at and self._sent_at[0] <= now - 60:
+            self._sent_at.popleft()
+
+    def _throttle(self):
+        now = time.monotonic()
+        self._expire(now)
+        if len(self._sent_at) >= self.per_minute:
+            time.sleep(self._sent_at[0] + 60 - now)
+            self._expire(time.monotonic())
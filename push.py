@@ -0,0 +1,72 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from http_client import POOL_MAXSIZE
+
+logger = logging.getLogger('golden_picks.push')
+
+# Sends in flight at once. More than the HTTP pool size would only queue on its connections.
+PUSH_WORKERS = int(os.environ.get('PUSH_WORKERS', POOL_MAXSIZE))
+# Sends per second across all workers. FCM's default project quota is 600k/min; staying far
+# below it leaves room for other senders on the project and avoids 429 bursts.
+PUSH_RATE = float(os.environ.get('PUSH_RATE', 200))
+
+# What a send function returns for one message
+SENT = 'sent'
+FAILED = 'failed'
+UNREGISTERED = 'unregistered'  # the token is gone for good (app uninstalled / token rotated)
+
+
+class _RateLimiter:
+    """Spaces calls to wait() at least 1/rate apart, across threads. rate <= 0 means no limit."""
+
+    def __init__(self, rate):
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def fan_out(messages, send, workers=PUSH_WORKERS, rate=PUSH_RATE):
+    """Send (token, title, body) messages through `send` on a bounded thread pool, at most `rate`
+    per second. `send` returns SENT / FAILED / UNREGISTERED and must not raise.
+
+    Returns the counts, the elapsed time and rate, and `outcomes`: each message's result, in order
+    (so the caller can retry the failures and forget UNREGISTERED tokens).
+    """
+    messages = list(messages)
+    stats = {'sent': 0, 'failed': 0, 'unregistered': 0, 'outcomes': [], 'elapsed_s': 0.0, 'per_s': 0.0}
+    if not messages:
+        return stats
+    limiter = _RateLimiter(rate)
+
+    def _send(message):
+        limiter.wait()
+        return send(*message)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(messages))), thread_name_prefix='push') as pool:
+        for outcome in pool.map(_send, messages):
+            stats['outcomes'].append(outcome)
+            if outcome == SENT:
+                stats['sent'] += 1
+            else:
+                stats['failed'] += 1
+                if outcome == UNREGISTERED:
+                    stats['unregistered'] += 1
+    elapsed = time.perf_counter() - t0
+    stats['elapsed_s'] = round(elapsed, 3)
+    stats['per_s'] = round(len(messages) / elapsed, 1) if elapsed else 0.0
+    return stats
@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+    _fcntl_available = True
+except ImportError:  # non-POSIX dev box: every process schedules
+    _fcntl_available = False
+
+logger = logging.getLogger('golden_picks.scheduler')
+
+
+class Scheduler:
+    """Background thread that calls `tick()` and sleeps until the UTC datetime it returns.
+
+    tick() runs whatever is due through run_job(), which records each job's outcome for status().
+    Only one process per host schedules: the first to take an flock on `lock_path` (gunicorn
+    workers and the dev reloader otherwise each run the jobs). A tick that raises is retried
+    after `retry_sleep` seconds.
+    """
+
+    def __init__(self, tick, lock_path=None, min_sleep=1, max_sleep=900, retry_sleep=60):
+        self._tick = tick
+        self._lock_path = lock_path
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+        self.retry_sleep = retry_sleep
+        self._jobs = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._lock_file = None
+        self._leader_pid = None
+        self.next_wake = None
+        self.last_tick = None
+
+    def start(self):
+        """Start the thread if it isn't running (cheap; safe to call on every request)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name='gameweek-scheduler', daemon=True)
+            self._thread.start()
+
+    def poke(self):
+        """Re-plan now instead of at the next wake-up (e.g. after an admin changed the gameweek)."""
+        self._wake.set()
+
+    def run_job(self, name, fn, *args):
+        """Run one job, recording its outcome. Never raises; returns True if it succeeded."""
+        job = self._jobs.setdefault(name, {'runs': 0, 'failures': 0, 'last_error': None})
+        started = datetime.utcnow()
+        t0 = time.monotonic()
+        try:
+            result = fn(*args)
+            ok = True
+        except Exception as e:
+            logger.error(f"Scheduled job {name} failed: {e}", exc_info=True)
+            result = None
+            ok = False
+            job['failures'] += 1
+            job['last_error'] = str(e)
+        job['runs'] += 1
+        job['last_run'] = started.isoformat() + 'Z'
+        job['last_ok'] = ok
+        job['last_result'] = result if isinstance(result, (int, float, str, bool, type(None))) else str(result)
+        job['last_duration_s'] = round(time.monotonic() - t0, 3)
+        return ok
+
+    def status(self):
+        return {
+            'scheduler_running': self._thread is not None and self._thread.is_alive(),
+            'scheduler_leader': self._is_leader(),
+            'last_tick': self.last_tick.isoformat() + 'Z' if self.last_tick else None,
+            'next_wake': self.next_wake.isoformat() + 'Z' if self.next_wake else None,
+            'jobs': {name: dict(job) for name, job in self._jobs.items()},
+        }
+
+    def _is_leader(self):
+        # Compared with the pid so a forked child doesn't inherit its parent's leadership
+        return self._leader_pid == os.getpid()
+
+    def _acquire_leader(self):
+        if self._is_leader():
+            return True
+        if not _fcntl_available or not self._lock_path:
+            self._leader_pid = os.getpid()
+            return True
+        f = None
+        try:
+            os.makedirs(os.path.dirname(self._lock_path), exist_ok=True)
+            f = open(self._lock_path, 'a')
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            if f is not None:
+                f.close()
+            return False
+        self._lock_file = f
+        self._leader_pid = os.getpid()
+        logger.info(f"Scheduler leader is pid {self._leader_pid}")
+        return True
+
+    def _loop(self):
+        while True:
+            wake = None
+            failed = False
+            if self._acquire_leader():
+                try:
+                    self.last_tick = datetime.utcnow()
+                    wake = self._tick()
+                except Exception as e:
+                    logger.error(f"Scheduler tick failed: {e}", exc_info=True)
+                    failed = True
+            now = datetime.utcnow()
+            if failed:
+                delay = self.retry_sleep  # don't leave due jobs waiting for max_sleep
+            else:
+                delay = self.max_sleep if wake is None else (wake - now).total_seconds()
+            delay = min(max(delay, self.min_sleep), self.max_sleep)
+            self.next_wake = now + timedelta(seconds=delay)
+            self._wake.wait(delay)
+            self._wake.clear()
@@ -1,12 +1,32 @@
-import requests
 from bs4 import BeautifulSoup
+import numpy as np
 import pandas as pd
 import dateparser
 import logging
+import gzip
+import hashlib
+import os
 import re
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from http_client import session
+
+try:
+    import lxml.html as _lxml_html
+    _lxml_available = True
+except ImportError:
+    _lxml_available = False
 
 logger = logging.getLogger('golden_picks.scraper')
 
+# 'lxml' walks only the cells we read with the C parser; 'html.parser' is the pure-Python
+# BeautifulSoup walk. lxml falls back to html.parser when it isn't installed.
+PARSER_BACKEND = os.environ.get('SCRAPER_PARSER', 'lxml')
+
 LEAGUE_PATH = "england/premier-league"
 LEAGUE_SIZE = 20
 # LEAGUE_PATH = "brazil/serie-b"
@@ -19,6 +39,151 @@ RESULTS_URL = f"https://www.betexplorer.com/football/{LEAGUE_PATH}/results/"
 # backend — which compares against datetime.utcnow() — gets the real kickoff times.
 SOURCE_TZ = "Europe/Berlin"
 
+# How long a downloaded page is reused before it's revalidated upstream. One scheduler tick
+# (rollover = teams + 3 start times, scoring = results + round scores) fits well inside this,
+# so each tick downloads a page at most once; the tick invalidates them when it's done.
+SNAPSHOT_TTL = 60
+
+# With SCRAPE_ARCHIVE_DIR set (e.g. instance/scrape_archive), every page that actually changed
+# upstream is also written there, gzipped, as <slug of url>/<UTC timestamp>.html.gz, keeping the
+# newest SCRAPE_ARCHIVE_KEEP copies of each page. Off by default: live scores change the results
+# page every poll during a round, and the app host's disk is not the place to keep them all.
+ARCHIVE_DIR = os.environ.get('SCRAPE_ARCHIVE_DIR', '')
+ARCHIVE_KEEP = int(os.environ.get('SCRAPE_ARCHIVE_KEEP', 2000))
+_ARCHIVE_TS_FORMAT = '%Y%m%dT%H%M%SZ'
+
+# SCRAPE_MODE=replay serves pages from the archive instead of the network: the newest
+# archived copy at or before SCRAPE_REPLAY_AT (ISO timestamp, UTC), or the newest overall.
+_replay = {
+    'on': os.environ.get('SCRAPE_MODE', 'live') == 'replay',
+    'at': os.environ.get('SCRAPE_REPLAY_AT'),
+    'ref_date': None,  # archive date of the page being replayed, so 'Today' means that day
+}
+
+class _PageSnapshot:
+    """One downloaded + parsed page, with the validators needed for a conditional GET."""
+    def __init__(self, text, etag, last_modified):
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.index = None  # round index, built on first use
+        self.fetched_at = time.monotonic()
+        self.digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        self.ref_date = None  # set for archived pages: the day they were scraped
+
+def _archive_slug(url):
+    return re.sub(r'[^A-Za-z0-9.-]+', '_', url.split('://', 1)[-1]).strip('_')
+
+def _archive_page(url, text):
+    if not ARCHIVE_DIR:
+        return
+    try:
+        folder = os.path.join(ARCHIVE_DIR, _archive_slug(url))
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, datetime.utcnow().strftime(_ARCHIVE_TS_FORMAT) + '.html.gz')
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(text)
+        for _, old in archived_pages(url)[:-ARCHIVE_KEEP]:
+            os.remove(old)
+    except OSError as e:
+        logger.warning(f"Could not archive {url}: {e}")
+
+def archived_pages(url, archive_dir=None):
+    """[(utc datetime, path)] of every archived copy of `url`, oldest first."""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if not archive_dir:
+        return []
+    folder = os.path.join(archive_dir, _archive_slug(url))
+    if not os.path.isdir(folder):
+        return []
+    pages = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.html.gz'):
+            pages.append((datetime.strptime(name[:-len('.html.gz')], _ARCHIVE_TS_FORMAT), os.path.join(folder, name)))
+    return pages
+
+def read_archived_page(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return f.read()
+
+@contextmanager
+def replay(at=None):
+    """Serve every scraper call from the archive inside the block, e.g. to re-derive an old
+    gameweek: `with replay('2025-10-18T12:00'): get_gameweek_teams(8)`."""
+    previous = dict(_replay)
+    _replay.update(on=True, at=at, ref_date=None)
+    try:
+        yield
+    finally:
+        _replay.update(previous)
+
+def _replay_snapshot(url):
+    pages = archived_pages(url)
+    if _replay['at']:
+        at = datetime.fromisoformat(str(_replay['at']).rstrip('Z'))
+        pages = [p for p in pages if p[0] <= at]
+    if not pages:
+        raise FileNotFoundError(f"No archived copy of {url}" + (f" at or before {_replay['at']}" if _replay['at'] else ''))
+    scraped_at, path = pages[-1]
+    with _snapshot_lock:
+        snap = _snapshots.get(path)
+        if snap is None:
+            snap = _PageSnapshot(read_archived_page(path), None, None)
+            snap.ref_date = scraped_at.date()
+            _snapshots[path] = snap
+    _replay['ref_date'] = snap.ref_date
+    return snap
+
+_snapshots = {}
+_snapshot_lock = threading.Lock()  # guards _snapshots and _fetch_locks; never held over HTTP
+_fetch_locks = {}  # url -> Lock, so one page's download doesn't hold up readers of the other
+
+def _fresh(snap):
+    return snap is not None and time.monotonic() - snap.fetched_at < SNAPSHOT_TTL
+
+def get_snapshot(url):
+    """Return the parsed page for `url`, downloading at most once per SNAPSHOT_TTL.
+    Once stale it's revalidated with If-None-Match / If-Modified-Since, so an unchanged page
+    costs a 304 and keeps its existing parse. Raises on HTTP errors.
+    In replay mode the page comes from the archive instead."""
+    if _replay['on']:
+        return _replay_snapshot(url)
+    with _snapshot_lock:
+        snap = _snapshots.get(url)
+        if _fresh(snap):
+            return snap
+        fetch_lock = _fetch_locks.setdefault(url, threading.Lock())
+    with fetch_lock:
+        # Another caller may have fetched it while we waited
+        with _snapshot_lock:
+            snap = _snapshots.get(url)
+        if _fresh(snap):
+            return snap
+        headers = {}
+        if snap is not None:
+            if snap.etag:
+                headers['If-None-Match'] = snap.etag
+            if snap.last_modified:
+                headers['If-Modified-Since'] = snap.last_modified
+        response = session.get(url, headers=headers)
+        if response.status_code == 304 and snap is not None:
+            snap.fetched_at = time.monotonic()
+            return snap
+        response.raise_for_status()
+        new = _PageSnapshot(response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        if snap is None or new.digest != snap.digest:
+            _archive_page(url, new.text)
+        with _snapshot_lock:
+            _snapshots[url] = new
+        return new
+
+def invalidate_snapshots():
+    """Force the next read of every page to revalidate upstream (still conditional). Called at
+    the end of each scheduler tick, so the next tick sees the live page."""
+    with _snapshot_lock:
+        for snap in _snapshots.values():
+            snap.fetched_at = float('-inf')
+
 def _to_utc(ts):
     if ts is None or pd.isna(ts):
         return ts
@@ -26,6 +191,12 @@ def _to_utc(ts):
             .tz_localize(SOURCE_TZ, ambiguous=True, nonexistent="shift_forward")
             .tz_convert("UTC").tz_localize(None).to_pydatetime())
 
+def _to_utc_series(dates):
+    """Vectorized _to_utc for a whole column of SOURCE_TZ kickoffs (None/NaT pass through)."""
+    return (pd.to_datetime(dates)
+            .dt.tz_localize(SOURCE_TZ, ambiguous=True, nonexistent="shift_forward")
+            .dt.tz_convert("UTC").dt.tz_localize(None))
+
 def _header_round(text):
     """Return the round number if `text` is a round-header row (e.g. '11. Round'), else None.
     Exact match — avoids the old substring bug where '1.' matched '11.', '21.', etc."""
@@ -36,44 +207,217 @@ def _header_round(text):
 
 TEAM_MAPS = {"Burnley":"BUR","Sunderland":"SUN","Leeds": "LEE","Leicester": "LEI", "ManchesterCity":"MCI","Liverpool":"LIV","WestHam":"WHU","Chelsea":"CHE","Ipswich":"IPS","Arsenal":"ARS","Brentford":"BRE","CrystalPalace":"CRY","Southampton":"SOU","Tottenham":"TOT","Wolves":"WOL","AstonVilla":"AVL","Brighton":"BHA","Fulham":"FUL","Bournemouth":"BOU","Newcastle":"NEW","ManchesterUtd":"MUN","Everton":"EVE","Nottingham":"NFO"}
 
-def fetch_data_fixtures(soup, round):
-    table_matches = soup.find('table')
+# One fixture / result line from the page. Odds stay as scraped strings; for fixtures they're
+# None until the bookmakers post them (the row still carries its kickoff, for start times).
+FixtureRow = namedtuple('FixtureRow', ['date', 'match', 'odd_1', 'odd_x', 'odd_2'])
+ResultRow = namedtuple('ResultRow', ['match', 'result', 'odds', 'date'])
+
+def _row_cells(row):
+    """Button odds followed by each cell's value (nested data-odd or text), as the page lays them out."""
+    utils = [button['data-odd'] for button in row.find_all('button')]
+    for element in row.find_all('td'):
+        try:
+            if 'data-odd' in element.attrs:
+                pass
+            else:
+                utils.append(element.span.span.span['data-odd'])
+        except:
+            utils.append(element.text)
+    return utils
+
+def _index_fixtures_bs4(text):
+    """Walk the fixtures table once and return {round: [FixtureRow]} for every round on the page."""
+    table_matches = BeautifulSoup(text, 'html.parser').find('table')
     if table_matches is None:
         logger.error("No table found on fixtures page")
-        return pd.DataFrame(columns=['Date','Match','1','X','2'])
-    data = []
-    rows = table_matches.find_all('tr')
-    if round is None:
-        round = 1
-    start_searching = False
-    for row in rows:
+        return {}
+    index = {}
+    current = None
+    for row in table_matches.find_all('tr'):
         hr = _header_round(row.text)
         if hr is not None:
-            if hr == round:
-                start_searching = True
-            elif start_searching:
-                break  # reached the next round's header
+            current = index.setdefault(hr, [])
             continue
-        if not start_searching:
+        if current is None:
             continue
-        utils = []
-        cols = row.find_all('td')
-        utils = [button['data-odd'] for button in row.find_all('button')]
-        for element in cols:
-            try:
-                if 'data-odd' in element.attrs:
-                    pass
-                else:
-                    utils.append(element.span.span.span['data-odd'])
-            except:
-                utils.append(element.text)
+        utils = _row_cells(row)
         if len(utils) == 10:
-            data.append(utils)
-    df = pd.DataFrame(data,columns=["1","X","2","Date","Match","-","-","-","-","-"])
-    return df[['Date','Match','1','X','2']]
-
+            current.append(FixtureRow(utils[3].strip(), utils[4], utils[0], utils[1], utils[2]))
+            continue
+        # Odds not posted yet — keep the kickoff so start times work weeks ahead
+        cell = row.find('td', class_='table-main__datetime')
+        if cell:
+            match = cell.find_next_sibling('td')
+            current.append(FixtureRow(cell.get_text(strip=True), match.text if match else '', None, None, None))
+    return index
+
+def _index_results_bs4(text):
+    """Walk the results table once and return {round: [ResultRow]}, in page order (newest first).
+    Rows above the first round header, if any, are kept under None."""
+    table_matches = BeautifulSoup(text, 'html.parser').find('table')
+    if table_matches is None:
+        logger.error("No table found on results page")
+        return {}
+    index = {}
+    current = None
+    for row in table_matches.find_all('tr'):
+        hr = _header_round(row.text)
+        if hr is not None:
+            current = index.setdefault(hr, [])
+            continue
+        utils = _row_cells(row)
+        if len(utils) == 4:
+            if current is None:
+                current = index.setdefault(None, [])
+            current.append(ResultRow(*utils))
+    return index
+
+def _lx_cell_value(td):
+    """lxml twin of the bs4 `element.span.span.span['data-odd']`-else-text cell read."""
+    span = td
+    for _ in range(3):
+        span = span.find('.//span')
+        if span is None:
+            return td.text_content()
+    odd = span.get('data-odd')
+    return odd if odd is not None else td.text_content()
+
+def _lx_table(text):
+    tables = _lxml_html.document_fromstring(text).xpath('(//table)[1]')
+    return tables[0] if tables else None
+
+def _lx_row(row, needed):
+    """(cell count, first `needed` values) for a row, in the same order as _row_cells.
+    Only the cells we actually read get their value extracted."""
+    utils = row.xpath('.//button/@data-odd')
+    cells = [td for td in row.iter('td') if td.get('data-odd') is None]
+    count = len(utils) + len(cells)
+    if count == needed:
+        utils = [str(odd) for odd in utils] + [_lx_cell_value(td) for td in cells[:max(0, needed - len(utils))]]
+    return count, utils
+
+def _index_fixtures_lxml(text):
+    table_matches = _lx_table(text)
+    if table_matches is None:
+        logger.error("No table found on fixtures page")
+        return {}
+    index = {}
+    current = None
+    for row in table_matches.iter('tr'):
+        hr = _header_round(row.text_content())
+        if hr is not None:
+            current = index.setdefault(hr, [])
+            continue
+        if current is None:
+            continue
+        count, utils = _lx_row(row, 10)
+        if count == 10:
+            current.append(FixtureRow(utils[3].strip(), utils[4], utils[0], utils[1], utils[2]))
+            continue
+        cell = row.xpath('.//td[contains(concat(" ", normalize-space(@class), " "), " table-main__datetime ")]')
+        if cell:
+            match = next(cell[0].itersiblings('td'), None)
+            current.append(FixtureRow(cell[0].text_content().strip(), match.text_content() if match is not None else '', None, None, None))
+    return index
+
+def _index_results_lxml(text):
+    table_matches = _lx_table(text)
+    if table_matches is None:
+        logger.error("No table found on results page")
+        return {}
+    index = {}
+    current = None
+    for row in table_matches.iter('tr'):
+        hr = _header_round(row.text_content())
+        if hr is not None:
+            current = index.setdefault(hr, [])
+            continue
+        count, utils = _lx_row(row, 4)
+        if count == 4:
+            if current is None:
+                current = index.setdefault(None, [])
+            current.append(ResultRow(*utils))
+    return index
+
+_PARSERS = {
+    'html.parser': {'fixtures': _index_fixtures_bs4, 'results': _index_results_bs4},
+    'lxml': {'fixtures': _index_fixtures_lxml, 'results': _index_results_lxml},
+}
+
+def _build_index(text, kind, backend=None):
+    """Round index for a 'fixtures' or 'results' page with the configured backend.
+    lxml is skipped when missing and falls back to html.parser if it chokes on the page."""
+    backend = backend or PARSER_BACKEND
+    if backend == 'lxml' and not _lxml_available:
+        backend = 'html.parser'
+    if backend != 'html.parser':
+        try:
+            return _PARSERS[backend][kind](text)
+        except Exception as e:
+            logger.warning(f"{backend} parse failed, falling back to html.parser: {e}")
+    return _PARSERS['html.parser'][kind](text)
+
+def fixtures_index():
+    """{round: [FixtureRow]} for the current fixtures snapshot, built once per download."""
+    snap = get_snapshot(FIXTURES_URL)
+    if snap.index is None:
+        snap.index = _build_index(snap.text, 'fixtures')
+    return snap.index
+
+def results_index():
+    """{round: [ResultRow]} for the current results snapshot, built once per download."""
+    snap = get_snapshot(RESULTS_URL)
+    if snap.index is None:
+        snap.index = _build_index(snap.text, 'results')
+    return snap.index
+
+def fetch_data_fixtures(index, round):
+    if round is None:
+        round = 1
+    data = [[r.date, r.match, r.odd_1, r.odd_x, r.odd_2] for r in index.get(round, []) if r.odd_1 is not None]
+    return pd.DataFrame(data, columns=['Date','Match','1','X','2'])
+
+
+# BetExplorer only ever renders a handful of kickoff formats; these skip dateparser entirely.
+_RELATIVE_DATE_RE = re.compile(r'^(today|tomorrow|yesterday)\s+(\d{1,2}):(\d{2})$', re.IGNORECASE)
+_DMY_DATE_RE = re.compile(r'^(\d{1,2})\.(\d{1,2})\.(\d{4})?\s+(\d{1,2}):(\d{2})$')
+_RELATIVE_DAYS = {'today': 0, 'tomorrow': 1, 'yesterday': -1}
+
+_date_stats = {'fast': 0, 'fallback': 0, 'failed': 0, 'fast_seconds': 0.0, 'fallback_seconds': 0.0}
+
+def _fast_date(date_str, ref_date):
+    """datetime for the known formats, None if `date_str` isn't one of them.
+    'dd.mm. HH:MM' without a year is the next such date on or after ref_date (future preference)."""
+    m = _RELATIVE_DATE_RE.match(date_str)
+    if m:
+        day = ref_date + timedelta(days=_RELATIVE_DAYS[m.group(1).lower()])
+        return datetime(day.year, day.month, day.day, int(m.group(2)), int(m.group(3)))
+    m = _DMY_DATE_RE.match(date_str)
+    if not m:
+        return None
+    day, month, year, hour, minute = (int(g) if g else None for g in m.groups())
+    if year is not None:
+        return datetime(year, month, day, hour, minute)
+    for year in range(ref_date.year, ref_date.year + 8):  # 8 years always reaches a 29.02.
+        try:
+            dt = datetime(year, month, day, hour, minute)
+        except ValueError:
+            continue
+        if dt.date() >= ref_date:
+            return dt
+    return None
 
-def process_date(date_str):
+@lru_cache(maxsize=4096)
+def _parse_date(date_str, ref_date):
+    t0 = time.perf_counter()
+    try:
+        dt = _fast_date(date_str, ref_date)
+    except ValueError:
+        dt = None
+    if dt is not None:
+        _date_stats['fast'] += 1
+        _date_stats['fast_seconds'] += time.perf_counter() - t0
+        return pd.Timestamp(dt)
     dt = dateparser.parse(
         date_str,
         settings={
@@ -81,10 +425,31 @@ def process_date(date_str):
             'PREFER_DATES_FROM': 'future',
         }
     )
+    _date_stats['fallback'] += 1
+    _date_stats['fallback_seconds'] += time.perf_counter() - t0
     if dt is None:
+        _date_stats['failed'] += 1
         return None
     return pd.Timestamp(dt)
 
+def process_date(date_str):
+    """Kickoff string -> naive Timestamp in SOURCE_TZ (None if unparseable). Memoized per day,
+    with a regex fast path for BetExplorer's formats and dateparser for anything else."""
+    return _parse_date(date_str.strip(), _replay['ref_date'] if _replay['on'] and _replay['ref_date'] else date.today())
+
+def date_parse_stats():
+    """Counters for process_date: cache hits/misses, fast-path vs dateparser parses and time spent."""
+    info = _parse_date.cache_info()
+    lookups = info.hits + info.misses
+    parsed = _date_stats['fast'] + _date_stats['fallback']
+    return {
+        'cache_hits': info.hits,
+        'cache_misses': info.misses,
+        'cache_hit_rate': info.hits / lookups if lookups else 0.0,
+        'fast_path_rate': _date_stats['fast'] / parsed if parsed else 0.0,
+        **_date_stats,
+    }
+
 def get_teams(match):
     # Split on " - " (not "-") so hyphenated club names survive (e.g. Operário-PR, América-MG).
     # Returns (None, None) for malformed cells (status text, awards) so one bad row can be dropped
@@ -96,12 +461,7 @@ def get_teams(match):
 
 def get_next_start_time(round):
     try:
-        URL = FIXTURES_URL
-        response = requests.get(URL, timeout=15)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        data = fetch_data_fixtures(soup, round)
+        data = fetch_data_fixtures(fixtures_index(), round)
 
         if data.empty:
             logger.warning(f"No fixture data for round {round}")
@@ -118,26 +478,11 @@ def get_round_start_time(round):
     """Earliest kickoff (UTC, minus 90 min) for a round straight off the fixtures page,
     parsing dates even when odds aren't posted yet (so it works for rounds 2-3 weeks out)."""
     try:
-        response = requests.get(FIXTURES_URL, timeout=15)
-        response.raise_for_status()
-        table = BeautifulSoup(response.text, 'html.parser').find('table')
-        if table is None:
-            return None
-        in_round = False
         dates = []
-        for row in table.find_all('tr'):
-            text = row.get_text(" ", strip=True)
-            if 'Round' in text and len(text) < 40:
-                m = re.search(r'(\d+)\.\s*Round|Round\s*(\d+)', text)
-                in_round = bool(m) and int(m.group(1) or m.group(2)) == round
-                continue
-            if not in_round:
-                continue
-            cell = row.find('td', class_='table-main__datetime')
-            if cell:
-                dt = process_date(cell.get_text(strip=True))
-                if dt is not None:
-                    dates.append(dt)
+        for row in fixtures_index().get(round, []):
+            dt = process_date(row.date)
+            if dt is not None:
+                dates.append(dt)
         if not dates:
             return None
         return _to_utc(min(dates) - pd.Timedelta(minutes=90))
@@ -145,55 +490,113 @@ def get_round_start_time(round):
         logger.error(f"get_round_start_time failed for round {round}: {e}")
         return None
 
+def _team_keys(matches):
+    """Vectorized get_teams over a 'Home - Away' column.
+    Returns (home1, away1, home_key, away_key) for the rows that split cleanly, plus that row mask."""
+    parts = matches.astype(str).str.split(' - ')
+    ok = (parts.str.len() == 2).to_numpy()
+    home1 = parts[ok].str[0].str.strip()
+    away1 = parts[ok].str[1].str.strip()
+    home_key = (home1 + '_' + away1 + '_H').str.replace(' ', '')
+    away_key = (away1 + '_' + home1 + '_A').str.replace(' ', '')
+    return home1.to_numpy(), away1.to_numpy(), home_key.to_numpy(), away_key.to_numpy(), ok
+
+def _score_parts(results):
+    """Vectorized 'N:N' split. Returns (home goals, away goals) int arrays and a clean-result mask."""
+    goals = results.astype(str).str.extract(r'^\s*(\d+)\s*:\s*(\d+)\s*$')
+    ok = goals[0].notna().to_numpy()
+    return goals[0][ok].astype(int).to_numpy(), goals[1][ok].astype(int).to_numpy(), ok
+
+def price_odds(odd_1, odd_x, odd_2, rounds=None):
+    """Vectorized 1/X/2 pricing kernel, one array entry per match.
+
+    Strips the bookmaker overround, turns the normalized probabilities into expected points for
+    each side, and ranks every side by its win odds into gold (shortest odds = most gold, centred
+    on LEAGUE_SIZE like the weekly game). Pass `rounds` to price many rounds in one call — ranks
+    and the centring are then per round. Matches with missing/zero odds get valid=False and are
+    left out of the ranking.
+
+    Returns a dict of arrays: p_1, p_x, p_2, xp_home, xp_away, rank_home, rank_away,
+    gold_home, gold_away, valid.
+    """
+    o1, ox, o2 = (np.asarray(pd.to_numeric(pd.Series(o), errors='coerce'), dtype=float) for o in (odd_1, odd_x, odd_2))
+    n = len(o1)
+    rounds = np.zeros(n, dtype=int) if rounds is None else np.asarray(rounds)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win, draw, lose = 1 / o1, 1 / ox, 1 / o2
+        valid = np.isfinite(win) & np.isfinite(draw) & np.isfinite(lose) & (o1 > 0) & (ox > 0) & (o2 > 0)
+        total = win + draw + lose
+        p_1, p_x, p_2 = win / total, draw / total, lose / total
+
+    # Both sides of each valid match, interleaved home/away so equal odds keep page order
+    idx = np.flatnonzero(valid)
+    side_odds = np.column_stack([o1[idx], o2[idx]]).ravel()
+    side_round = np.repeat(rounds[idx], 2)
+    order = np.lexsort((side_odds, side_round))
+    _, starts, counts = np.unique(side_round[order], return_index=True, return_counts=True)
+    ranks = np.empty(len(order), dtype=int)
+    ranks[order] = np.arange(len(order)) - np.repeat(starts, counts)
+    centre = np.empty(len(order))
+    centre[order] = np.repeat((LEAGUE_SIZE - counts) / 2, counts)
+    gold = (LEAGUE_SIZE - ranks - centre).astype(int)
+
+    out = {
+        'p_1': p_1, 'p_x': p_x, 'p_2': p_2,
+        'xp_home': 3 * p_1 + p_x, 'xp_away': 3 * p_2 + p_x,
+        'valid': valid,
+    }
+    for name, side in (('home', 0), ('away', 1)):
+        out[f'rank_{name}'] = np.full(n, -1)
+        out[f'rank_{name}'][idx] = ranks[side::2]
+        out[f'gold_{name}'] = np.zeros(n, dtype=int)
+        out[f'gold_{name}'][idx] = gold[side::2]
+    return out
+
+def price_fixtures(index, rounds=None):
+    """Price every round of a {round: [FixtureRow]} index (e.g. an archived fixtures page) in one
+    kernel call. Returns {round: (gold, ex_points)} in the same shape get_gameweek_teams returns."""
+    rows = [(r, row) for r in (index if rounds is None else rounds) for row in index.get(r, []) if row.odd_1 is not None]
+    if not rows:
+        return {}
+    data = pd.DataFrame([row for _, row in rows], columns=FixtureRow._fields)
+    data['round'] = [r for r, _ in rows]
+    _, _, home, away, ok = _team_keys(data['match'])
+    data = data[ok]
+    priced = price_odds(data['odd_1'], data['odd_x'], data['odd_2'], rounds=data['round'].to_numpy())
+    out = {}
+    v = priced['valid']
+    for r in pd.unique(data['round']):
+        m = v & (data['round'].to_numpy() == r)
+        sides = sorted(zip(np.concatenate([priced['rank_home'][m], priced['rank_away'][m]]),
+                           np.concatenate([home[m], away[m]]),
+                           np.concatenate([priced['gold_home'][m], priced['gold_away'][m]])))
+        ex_points = {}
+        for h, a, xh, xa in zip(home[m], away[m], priced['xp_home'][m], priced['xp_away'][m]):
+            ex_points[h] = float(xh)
+            ex_points[a] = float(xa)
+        out[int(r)] = ({key.strip(): int(g) for _, key, g in sides}, ex_points)
+    return out
+
 def get_gameweek_teams(round):
     try:
-        URL = FIXTURES_URL
-        response = requests.get(URL, timeout=15)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        data = fetch_data_fixtures(soup, round)
+        if round is None:
+            round = 1
+        # One read, so the kickoffs and the prices come from the same page even if the
+        # snapshot expires in between
+        index = fixtures_index()
+        data = fetch_data_fixtures(index, round)
 
         if data.empty:
             logger.error(f"No fixture data for round {round} — returning empty")
             return {}, {}, None, None
 
-        data['Date'] = data['Date'].apply(process_date)
-        first_game = _to_utc(data['Date'].min() - pd.Timedelta(minutes=90))
-        last_game = _to_utc(data['Date'].max() + pd.Timedelta(minutes=240))
-
-        data[['home1','away1']]  = data['Match'].apply(get_teams).apply(pd.Series)
-        data = data.dropna(subset=['home1','away1'])
-        data['home'] = data['home1'] + '_' + data['away1'] +'_H'
-        data['away'] = data['away1'] + '_' + data['home1'] +'_A'
-        data['home']=data['home'].str.replace(' ','')
-        data['away']=data['away'].str.replace(' ','')
+        kickoffs = _to_utc_series(data['Date'].apply(process_date))
+        first_game = (kickoffs.min() - pd.Timedelta(minutes=90)).to_pydatetime()
+        last_game = (kickoffs.max() + pd.Timedelta(minutes=240)).to_pydatetime()
 
-        odds = {}
-        ex_points = {}
-        for _,row in data.iterrows():
-            try:
-                win = 1/float(row['1'])
-                draw = 1/float(row['X'])
-                lose = 1/float(row['2'])
-            except (ValueError, ZeroDivisionError):
-                continue  # postponed / no odds yet — skip this game, keep the rest of the round
-            total = (win + draw+lose)
-            win2 = win/total
-            draw2 = draw/total
-            lose2 = lose/total
-
-            odds[row['home']]=float(row['1'])
-            odds[row['away']]= float(row['2'])
-
-            ex_points[row['home']] = 3*win2 + draw2
-            ex_points[row['away']] = 3*lose2 + draw2
-
-        sorted_odds= dict(sorted(odds.items(), key=lambda item: float(item[1])))
-        ordered_list = list(sorted_odds.keys())
-        L =  (LEAGUE_SIZE-len(ordered_list))/2
-        logger.info(f"Scraped round {round}: {len(ordered_list)} teams")
-        return {ordered_list[i].strip():int(LEAGUE_SIZE-i-L) for i in range(len(ordered_list))},ex_points, first_game, last_game
+        gold, ex_points = price_fixtures(index, rounds=[round]).get(round, ({}, {}))
+        logger.info(f"Scraped round {round}: {len(gold)} teams")
+        return gold, ex_points, first_game, last_game
     except Exception as e:
         logger.error(f"get_gameweek_teams failed for round {round}: {e}")
         return {}, {}, None, None
@@ -208,60 +611,24 @@ def get_result_points_away(result_str):
     return int(away) - int(home)
 
 
-def fetch_data_results(soup):
-    table_matches = soup.find('table')
-    if table_matches is None:
-        logger.error("No table found on results page")
-        return pd.DataFrame(columns=["Match","result","odds","date"])
-    data = []
-    rows = table_matches.find_all('tr')
-    for row in rows:
-        utils = []
-        cols = row.find_all('td')
-        utils = [button['data-odd'] for button in row.find_all('button')]
-        for element in cols:
-            try:
-                if 'data-odd' in element.attrs:
-                    pass
-                else:
-                    utils.append(element.span.span.span['data-odd'])
-            except:
-                utils.append(element.text)
-
-        if len(utils) == 4:
-            data.append(utils)
-
-    df = pd.DataFrame(data,columns=["Match","result","odds","date"])
-    return df
+def fetch_data_results(index):
+    data = [list(r) for rows in index.values() for r in rows]
+    return pd.DataFrame(data,columns=["Match","result","odds","date"])
 
 def get_results():
     try:
-        URL = RESULTS_URL
-        response = requests.get(URL, timeout=15)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        data = fetch_data_results(soup)
+        data = fetch_data_results(results_index())
         if data.empty:
             logger.warning("No results data found")
             return {}
 
-        data[['home1','away1']]  = data['Match'].apply(get_teams).apply(pd.Series)
-        data = data.dropna(subset=['home1','away1'])
-        data['home'] = data['home1'] + '_' + data['away1'] +'_H'
-        data['away'] = data['away1'] + '_' + data['home1'] +'_A'
-        data['home']=data['home'].str.replace(' ','')
-        data['away']=data['away'].str.replace(' ','')
-
+        _, _, home, away, ok = _team_keys(data['Match'])
+        h, a, scored = _score_parts(data['result'][ok])
+        gd = h - a
         points = {}
-        for _,row in data.iterrows():
-            try:
-                h, a = row['result'].split(':')
-                gd_home, gd_away = int(h) - int(a), int(a) - int(h)
-            except (ValueError, AttributeError):
-                continue  # not a clean 'N:N' result (postponed/awarded) — skip this game
-            points[row['home']] = gd_home
-            points[row['away']] = gd_away
+        for home_key, away_key, g in zip(home[scored], away[scored], gd.tolist()):
+            points[home_key] = g
+            points[away_key] = -g
 
         return points
     except Exception as e:
@@ -269,69 +636,22 @@ def get_results():
         return {}
 
 
-def fetch_data_scores(soup, round):
-    table_matches = soup.find('table')
-    if table_matches is None:
-        logger.error("No table found on results page for scores")
-        return pd.DataFrame(columns=["Match","result","odds","date"])
-    data = []
-    rows = table_matches.find_all('tr')
-    in_round = False
-    for row in rows:
-        hr = _header_round(row.text)
-        if hr is not None:
-            if hr == round:
-                in_round = True
-            elif in_round:
-                break  # reached the next round's section
-            continue
-        if not in_round:
-            continue
-        utils = []
-        cols = row.find_all('td')
-        utils = [button['data-odd'] for button in row.find_all('button')]
-        for element in cols:
-            try:
-                if 'data-odd' in element.attrs:
-                    pass
-                else:
-                    utils.append(element.span.span.span['data-odd'])
-            except:
-                utils.append(element.text)
-
-        if len(utils) == 4:
-            data.append(utils)
-
-    df = pd.DataFrame(data,columns=["Match","result","odds","date"])
-    return df
+def fetch_data_scores(index, round):
+    data = [list(r) for r in index.get(round, [])]
+    return pd.DataFrame(data,columns=["Match","result","odds","date"])
 
 def get_round_scores(round):
     try:
-        URL = RESULTS_URL
-        response = requests.get(URL, timeout=15)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        data = fetch_data_scores(soup, round)
+        data = fetch_data_scores(results_index(), round)
         if data.empty:
             return []
-        data[['home1','away1']]  = data['Match'].apply(get_teams).apply(pd.Series)
-        data = data.dropna(subset=['home1','away1'])
-        data['home'] = data['home1'] + '_' + data['away1'] +'_H'
-        data['away'] = data['away1'] + '_' + data['home1'] +'_A'
-        data['home']=data['home'].str.replace(' ','')
-        data['away']=data['away'].str.replace(' ','')
-
+        home1, away1, _, _, ok = _team_keys(data['Match'])
+        h, a, scored = _score_parts(data['result'][ok])
         scores = []
-        for _,row in data.iterrows():
-            try:
-                h, a = row.result.split(':')
-                h, a = int(h), int(a)
-            except (ValueError, AttributeError):
-                continue  # not a clean 'N:N' result (postponed/awarded) — skip this game
-            name1 = row['home1'].replace(' ','')
-            name2 = row['away1'].replace(' ','')
-            score = {"team1": TEAM_MAPS.get(name1, name1), "team2": TEAM_MAPS.get(name2, name2), "score1": h, "score2": a}
-            scores += [score]
+        for name1, name2, score1, score2 in zip(home1[scored], away1[scored], h.tolist(), a.tolist()):
+            name1 = name1.replace(' ','')
+            name2 = name2.replace(' ','')
+            scores.append({"team1": TEAM_MAPS.get(name1, name1), "team2": TEAM_MAPS.get(name2, name2), "score1": score1, "score2": score2})
         return scores
     except Exception as e:
         logger.error(f"get_round_scores failed for round {round}: {e}")